@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+bench
+
+benchmark the protocol commands against fake_chamber.py
+
+The cli group is driven in process with CHAMBER pointing at the fake
+chamber, so each measurement covers the helper's own work plus the
+chamber processes it spawns.  Results are written as JSON for comparison
+between releases.
+"""
+
+import json
+import math
+import platform
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import click
+from click.testing import CliRunner
+
+from docker_credential_chamber import __version__, cli
+from docker_credential_chamber.dcc import encode_server
+
+FAKE_CHAMBER = Path(__file__).resolve().parent / "fake_chamber.py"
+SERVICE = "bench/credentials"
+COMMANDS = ["get", "list", "store", "erase"]
+
+
+def percentile(samples, p):
+    """nearest-rank percentile"""
+    samples = sorted(samples)
+    return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+
+def seed(path, registries):
+    keys = {
+        encode_server(f"registry{i}.example.org"): json.dumps(
+            {"Username": f"user{i}", "Secret": "secret"}
+        )
+        for i in range(registries)
+    }
+    path.write_text(json.dumps({"services": {SERVICE: keys}, "pending": []}))
+
+
+def command_input(command, i):
+    if command == "get":
+        return "registry0.example.org"
+    if command == "store":
+        return json.dumps(
+            {
+                "ServerURL": f"bench{i}.example.org",
+                "Username": "bench",
+                "Secret": "secret",
+            }
+        )
+    if command == "erase":
+        return f"bench{i}.example.org"
+    return None
+
+
+def read_log(path):
+    if not path.is_file():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def bench(registries, iterations, latency, consistency_delay):
+    """return a result dict for each command against a seeded store"""
+    results = []
+    with TemporaryDirectory() as tempdir:
+        tempdir = Path(tempdir)
+        store = tempdir / "store.json"
+        log = tempdir / "calls.jsonl"
+        seed(store, registries)
+        env = {
+            "CHAMBER": str(FAKE_CHAMBER),
+            "FAKE_CHAMBER_STORE": str(store),
+            "FAKE_CHAMBER_LOG": str(log),
+            "FAKE_CHAMBER_LATENCY": str(latency),
+            "FAKE_CHAMBER_CONSISTENCY_DELAY": str(consistency_delay),
+            "DOCKER_CREDENTIALS_SERVICE": SERVICE,
+            "DOCKER_CREDENTIALS_BACKEND": "chamber",
+            "DOCKER_CREDENTIALS_SOCKET": str(tempdir / "none.sock"),
+            "DOCKER_CREDENTIALS_CACHE": "0",
+            "DOCKER_CREDENTIALS_DEBUG": None,
+            "DOCKER_CREDENTIALS_LOGFILE": None,
+        }
+        runner = CliRunner()
+        for command in COMMANDS:
+            samples = []
+            calls = []
+            for i in range(iterations):
+                log.unlink(missing_ok=True)
+                start = time.perf_counter()
+                result = runner.invoke(
+                    cli, [command], input=command_input(command, i), env=env
+                )
+                samples.append(time.perf_counter() - start)
+                if result.exit_code != 0:
+                    raise click.ClickException(
+                        f"{command} failed: {result.output or result.exception}"
+                    )
+                calls.extend(read_log(log))
+            results.append(
+                {
+                    "command": command,
+                    "registries": registries,
+                    "iterations": iterations,
+                    "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                    "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                    "spawns": len(calls) / iterations,
+                    "bytes_in": sum(c["bytes_in"] for c in calls) / iterations,
+                    "bytes_out": sum(c["bytes_out"] for c in calls)
+                    / iterations,
+                }
+            )
+    return results
+
+
+@click.command("bench")
+@click.option(
+    "--sizes",
+    default="1,100,1000",
+    show_default=True,
+    help="comma separated registry counts to seed the store with",
+)
+@click.option("-n", "--iterations", type=int, default=20, show_default=True)
+@click.option(
+    "--latency",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="seconds added to every fake chamber call",
+)
+@click.option(
+    "--consistency-delay",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="seconds before fake chamber writes become visible",
+)
+@click.option(
+    "-o", "--output", type=click.File("w"), default="-", help="JSON output"
+)
+def main(sizes, iterations, latency, consistency_delay, output):
+    """benchmark get/list/store/erase against a fake chamber"""
+    results = []
+    for size in sizes.split(","):
+        results.extend(bench(int(size), iterations, latency, consistency_delay))
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "latency": latency,
+        "consistency_delay": consistency_delay,
+        "results": results,
+    }
+    json.dump(report, output, indent=2)
+    output.write("\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
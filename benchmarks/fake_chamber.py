@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+fake_chamber
+
+scripted stand-in for the chamber binary used by the benchmarks
+
+Services are kept in the JSON file named by FAKE_CHAMBER_STORE.  Every
+call sleeps FAKE_CHAMBER_LATENCY seconds, and writes and deletes become
+visible only FAKE_CHAMBER_CONSISTENCY_DELAY seconds after they are made.
+Each call appends a JSON line with its arguments and the bytes exchanged
+to FAKE_CHAMBER_LOG.
+"""
+
+import fcntl
+import json
+import os
+import sys
+import time
+from hashlib import sha256
+from pathlib import Path
+
+VERSION = "v2.10.0-fake"
+
+
+class Store:
+    def __init__(self, path, delay):
+        self.path = Path(path)
+        self.delay = delay
+        self.fp = self.path.open("a+")
+        fcntl.flock(self.fp, fcntl.LOCK_EX)
+        self.fp.seek(0)
+        data = self.fp.read()
+        data = json.loads(data) if data else {}
+        self.services = data.get("services", {})
+        self.pending = data.get("pending", [])
+        now = time.time()
+        while self.pending and self.pending[0][0] <= now:
+            self._apply(*self.pending.pop(0)[1:])
+
+    def _apply(self, service, key, value):
+        keys = self.services.setdefault(service, {})
+        if value is None:
+            keys.pop(key, None)
+        else:
+            keys[key] = value
+        if not keys:
+            self.services.pop(service)
+
+    def change(self, service, key, value):
+        if self.delay:
+            self.pending.append([time.time() + self.delay, service, key, value])
+        else:
+            self._apply(service, key, value)
+
+    def close(self):
+        self.fp.seek(0)
+        self.fp.truncate()
+        json.dump({"services": self.services, "pending": self.pending}, self.fp)
+        self.fp.close()
+
+
+def _list(keys):
+    # value digests stand in for parameter versions
+    rows = [
+        f"{key}\t{sha256(value.encode()).hexdigest()[:8]}\t-\tfake\n"
+        for key, value in sorted(keys.items())
+    ]
+    return "Key\tVersion\tLastModified\tUser\n" + "".join(rows)
+
+
+def _parse(args):
+    """return the positional args, as chamber's parser splits them
+
+    Arguments starting with "-" are flags unless they follow "--"; any
+    flag but -q raises ValueError.
+    """
+    end = args.index("--") if "--" in args else len(args)
+    flags = [arg for arg in args[:end] if arg.startswith("-")]
+    for flag in flags:
+        if flag != "-q":
+            raise ValueError(f"unknown shorthand flag: {flag}")
+    return [arg for arg in args[:end] if arg not in flags] + args[end:][1:]
+
+
+def run(store, args):
+    """return (exit_code, stdout) for a chamber command line"""
+    command, args = args[0], args[1:]
+    if command in ("version", "--version"):
+        return 0, f"chamber {VERSION}\n"
+    if command == "list-services":
+        return 0, "".join(f"{service}\n" for service in store.services)
+    if command == "export":
+        return 0, json.dumps(store.services.get(args[0], {}))
+    if command == "list":
+        return 0, _list(store.services.get(args[0], {}))
+    args = _parse(args)
+    keys = store.services.get(args[0], {})
+    if command == "read":
+        if args[1] not in keys:
+            return 1, "secret not found"
+        return 0, keys[args[1]] + "\n"
+    if command == "write":
+        store.change(args[0], args[1], args[2])
+        return 0, ""
+    if command == "delete":
+        if args[1] not in keys:
+            return 1, "secret not found"
+        store.change(args[0], args[1], None)
+        return 0, ""
+    return 1, ""
+
+
+def main():
+    time.sleep(float(os.environ.get("FAKE_CHAMBER_LATENCY", 0)))
+    store = Store(
+        os.environ["FAKE_CHAMBER_STORE"],
+        float(os.environ.get("FAKE_CHAMBER_CONSISTENCY_DELAY", 0)),
+    )
+    try:
+        exit_code, output = run(store, sys.argv[1:])
+    except ValueError as e:
+        exit_code, output = 1, str(e)
+    finally:
+        store.close()
+    if exit_code:
+        # chamber prints its errors, such as "secret not found", on stderr
+        reason = f": {output}" if output else ""
+        sys.stderr.write(
+            f"Error: chamber {' '.join(sys.argv[1:3])} failed{reason}\n"
+        )
+        output = ""
+    sys.stdout.write(output)
+    log = os.environ.get("FAKE_CHAMBER_LOG")
+    if log:
+        record = {
+            "args": sys.argv[1:2],
+            "bytes_in": len(" ".join(sys.argv[1:]).encode()),
+            "bytes_out": len(output.encode()),
+        }
+        with open(log, "a") as fp:
+            fp.write(json.dumps(record) + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
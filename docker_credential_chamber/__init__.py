@@ -9,7 +9,28 @@ docker_credential_chamber
 
 """
 
-from .cli import cli
+import sys
+from types import ModuleType
+
 from .version import __version__
 
 __all__ = ["cli", "__version__"]
+
+
+class _Package(ModuleType):
+    # the click group is imported on first use so the protocol commands
+    # dispatched by main() do not pay for importing click
+
+    @property
+    def cli(self):
+        from .cli import cli
+
+        return cli
+
+    @cli.setter
+    def cli(self, module):
+        # importing the submodule binds its name here; keep the group
+        pass
+
+
+sys.modules[__name__].__class__ = _Package
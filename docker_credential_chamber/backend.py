@@ -0,0 +1,273 @@
+"""
+backend
+
+storage backends used by DCC
+
+A backend stores string values under the encoded server keys of one
+chamber service.  ChamberBackend runs the chamber binary; the native
+backends in vault.py and ssm.py talk to the storage APIs directly.
+MemoryBackend keeps the keys in a dict (optionally a JSON file) for tests
+and benchmarks.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from hashlib import sha256
+from pathlib import Path
+from subprocess import PIPE, CalledProcessError, check_output
+
+BACKENDS = ["chamber", "vault", "ssm", "memory"]
+
+
+class BackendError(Exception):
+    pass
+
+
+class Throttled(BackendError):
+    """the backend refused a call because of its request rate limit"""
+
+
+class NotFound(BackendError):
+    """chamber reported that the key or service does not exist"""
+
+
+# backend error messages caused by request rate limits
+THROTTLED = re.compile(
+    r"throttl|rate exceeded|too ?many ?requests|requestlimitexceeded|"
+    r"slow ?down|\b429\b",
+    re.IGNORECASE,
+)
+
+
+# chamber's errors for a missing secret, parameter or service
+NOT_FOUND = re.compile(r"not found|ParameterNotFound", re.IGNORECASE)
+
+
+def _stderr(error):
+    return (error.stderr or b"").decode(errors="replace").strip()
+
+
+def throttled(error):
+    """return True if error reports a backend rate limit"""
+    if isinstance(error, Throttled):
+        return True
+    if isinstance(error, CalledProcessError):
+        # the command line holds service and key names; check only stderr
+        return bool(THROTTLED.search(_stderr(error)))
+    return bool(THROTTLED.search(str(error)))
+
+
+class Backend:
+    """interface implemented by storage backends"""
+
+    # processes started by each storage call
+    spawns_per_call = 0
+
+    # True if changing many keys at once costs about as much as one; DCC
+    # then changes them with write_keys and reads them back with export
+    batched = False
+
+    def __init__(self, service):
+        self.service = service
+
+    def __str__(self):
+        return self.__class__.__name__.lower().replace("backend", "")
+
+    def read_key(self, key):
+        """return the value stored under key or None if not present"""
+        raise NotImplementedError
+
+    def write_key(self, key, value):
+        raise NotImplementedError
+
+    def delete_key(self, key):
+        raise NotImplementedError
+
+    def write_keys(self, changes):
+        """apply {key: value} changes; a value of None deletes the key"""
+        for key, value in changes.items():
+            if value is None:
+                self.delete_key(key)
+            else:
+                self.write_key(key, value)
+
+    def export(self):
+        """return {key: value} for the service; empty if it does not exist"""
+        raise NotImplementedError
+
+    def exists(self):
+        """return True if the service holds any keys"""
+        raise NotImplementedError
+
+    def versions(self):
+        """return {key: version} without reading values
+
+        A version changes whenever its value does.  None means the
+        backend cannot tell more cheaply than by reading the values.
+        """
+        return None
+
+    def version(self):
+        return str(self)
+
+
+class ChamberBackend(Backend):
+    spawns_per_call = 1
+
+    def __init__(self, service, chamber="chamber", env=None):
+        super().__init__(service)
+        self.chamber = chamber
+        self.env = env
+        self._exists = None
+
+    def __str__(self):
+        return Path(self.chamber).stem
+
+    def version(self):
+        try:
+            version = check_output([self.chamber, "version"])
+        except CalledProcessError:
+            version = check_output([self.chamber, "--version"])
+        return f"{self.chamber} {version}"
+
+    def _run(self, *args, quiet=False):
+        """return chamber's output for args
+
+        stderr is captured so rate limiting and missing keys can be
+        recognized as Throttled and NotFound; on other failures it is
+        passed on unless quiet
+        """
+        try:
+            return check_output(
+                [self.chamber, *args], env=self.env, stderr=PIPE
+            ).decode()
+        except CalledProcessError as e:
+            if throttled(e):
+                raise Throttled(f"chamber {args[0]}: {_stderr(e)}") from e
+            if NOT_FOUND.search(_stderr(e)):
+                raise NotFound(f"chamber {args[0]}: {_stderr(e)}") from e
+            if e.stderr and not quiet:
+                sys.stderr.write(_stderr(e) + "\n")
+            raise
+
+    def read_key(self, key):
+        try:
+            data = self._run("read", "-q", "--", self.service, key)
+        except NotFound:
+            return None
+        return data.removesuffix("\n")
+
+    def write_key(self, key, value):
+        # chunked documents and encoded keys may begin with "-"
+        self._run("write", "--", self.service, key, value)
+        self._exists = True
+
+    def delete_key(self, key):
+        self._run("delete", "--", self.service, key)
+        # other keys may remain; check again when next asked
+        self._exists = None
+
+    def export(self):
+        try:
+            data = self._run("export", self.service)
+        except NotFound:
+            return {}
+        return json.loads(data) if len(data) else {}
+
+    def exists(self):
+        # exporting the one service is far cheaper than list-services,
+        # which enumerates every service in the account; the answer is
+        # kept for the life of the process and updated by our own changes
+        if self._exists is None:
+            self._exists = bool(self.export())
+        return self._exists
+
+    def versions(self):
+        # 'chamber list' prints Key, Version, LastModified and User
+        # columns from parameter metadata without decrypting any values
+        try:
+            data = self._run("list", self.service, quiet=True)
+        except NotFound:
+            return {}
+        rows = [line.split() for line in data.splitlines()[1:]]
+        return {row[0]: row[1] for row in rows if len(row) > 1}
+
+
+class MemoryBackend(Backend):
+    """fake backend holding all services in a dict
+
+    If path is set, the services are loaded from and saved to that JSON
+    file on every call so separate processes share the store.  Calls are
+    counted by method name in self.calls.  Changes are serialized between
+    threads.
+    """
+
+    def __init__(self, service, path=None, services=None):
+        super().__init__(service)
+        self.path = Path(path) if path else None
+        self.services = services if services is not None else {}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def _load(self, method):
+        self.calls[method] += 1
+        if self.path and self.path.is_file():
+            self.services = json.loads(self.path.read_text())
+        return self.services.setdefault(self.service, {})
+
+    def _save(self):
+        self.services = {k: v for k, v in self.services.items() if v}
+        if self.path:
+            temp = self.path.with_name(f".{self.path.name}.{os.getpid()}")
+            temp.write_text(json.dumps(self.services))
+            os.replace(temp, self.path)
+
+    def read_key(self, key):
+        return self._load("read_key").get(key)
+
+    def write_key(self, key, value):
+        with self.lock:
+            self._load("write_key")[key] = value
+            self._save()
+
+    def delete_key(self, key):
+        with self.lock:
+            keys = self._load("delete_key")
+            if key not in keys:
+                raise BackendError(f"key '{key}' not found in '{self.service}'")
+            keys.pop(key)
+            self._save()
+
+    def export(self):
+        return dict(self._load("export"))
+
+    def exists(self):
+        return bool(self._load("exists"))
+
+    def versions(self):
+        # digests stand in for the version numbers of real backends
+        return {
+            key: sha256(value.encode()).hexdigest()[:16]
+            for key, value in self._load("versions").items()
+        }
+
+
+def open_backend(name, service, env, chamber="chamber"):
+    """return a backend instance by name"""
+    if name == "chamber":
+        return ChamberBackend(service, chamber=chamber, env=env)
+    elif name == "vault":
+        from .vault import VaultBackend
+
+        return VaultBackend(service, env)
+    elif name == "ssm":
+        from .ssm import SSMBackend
+
+        return SSMBackend(service, env)
+    elif name == "memory":
+        return MemoryBackend(service, env.get("DOCKER_CREDENTIALS_MEMORY_FILE"))
+    raise BackendError(f"unknown backend '{name}'")
@@ -0,0 +1,272 @@
+"""
+cache
+
+read-through caches for credentials
+
+CredentialCache stores entries one per file under $XDG_RUNTIME_DIR,
+encrypted with a key derived from the backend credentials present in the
+environment; it requires the optional 'cryptography' package.
+KeyringCache keeps them in a Linux kernel keyring instead, so nothing is
+written to disk.
+"""
+
+import json
+import os
+import threading
+import time
+from base64 import urlsafe_b64encode
+from collections import OrderedDict
+from hashlib import sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+CACHE_TTL = 300
+CACHE_SIZE = 100
+
+# seconds after which a cached entry is refreshed in the background while
+# still being served; 0 disables
+REFRESH_AFTER = 0
+
+# seconds a server without stored credentials is remembered; 0 disables
+MISS_TTL = 0
+
+# secrets held by the caller for the chamber backend
+KEY_SECRETS = ["VAULT_TOKEN", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"]
+
+# non-secret environment binding the key to a backend and identity
+KEY_CONTEXT = ["VAULT_ADDR", "AWS_ACCESS_KEY_ID", "AWS_REGION"]
+
+# where --cache keeps entries
+CACHE_STORES = ["file", "session-keyring", "user-keyring"]
+
+# tag for the cache entry holding the full export of a service
+EXPORT = "*"
+
+
+class CacheUnavailable(Exception):
+    pass
+
+
+def _material(env):
+    return [f"{k}={env.get(k, '')}" for k in KEY_SECRETS + KEY_CONTEXT]
+
+
+class FileCache:
+    """entries stored one per file in self.path, evicted by mtime"""
+
+    path = None
+    size = CACHE_SIZE
+
+    def _evict(self):
+        entries = []
+        for path in self.path.glob("*-*"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[: max(0, len(entries) - self.size)]:
+            self._unlink(path)
+
+    def _unlink(self, path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class CredentialCache(FileCache):
+    def __init__(self, service, env, ttl=CACHE_TTL, size=CACHE_SIZE):
+        try:
+            from cryptography.fernet import Fernet, InvalidToken
+        except ImportError as e:
+            raise CacheUnavailable("cache requires 'cryptography'") from e
+        runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+        if not runtime_dir:
+            raise CacheUnavailable("XDG_RUNTIME_DIR is not set")
+        if not any(env.get(k) for k in KEY_SECRETS):
+            raise CacheUnavailable("no backend credentials to derive a key")
+        material = _material(env)
+        self.service = service
+        self.ttl = ttl
+        self.size = size
+        self.path = Path(runtime_dir) / "docker-credential-chamber"
+        self.path.mkdir(mode=0o700, exist_ok=True)
+        digest = sha256("\0".join([service] + material).encode()).digest()
+        self.fernet = Fernet(urlsafe_b64encode(digest))
+        self.invalid_token = InvalidToken
+        # entries written under a different key are unreadable; keep apart
+        self.namespace = sha256(b"namespace" + digest).hexdigest()[:16]
+
+    def _file(self, key):
+        name = sha256(f"{self.service}\0{key}".encode()).hexdigest()
+        return self.path / f"{self.namespace}-{name}"
+
+    def get(self, key):
+        """return cached value for key or None if missing or expired"""
+        path = self._file(key)
+        try:
+            token = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            value = json.loads(self.fernet.decrypt(token, self.ttl))
+        except (ValueError, self.invalid_token):
+            # expired or corrupt
+            self._unlink(path)
+            return None
+        # mtime records last access for LRU eviction
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        token = self.fernet.encrypt(json.dumps(value).encode())
+        with NamedTemporaryFile(dir=self.path, delete=False) as fp:
+            fp.write(token)
+        os.replace(fp.name, self._file(key))
+        self._evict()
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self._unlink(self._file(key))
+
+
+class KeyringCache:
+    """entries held as 'user' keys in a Linux kernel keyring
+
+    The kernel expires each entry after ttl seconds and discards them all
+    with the keyring.  Keys are only readable by the user, so the
+    namespace just keeps services and backend identities apart.  Entries
+    beyond the kernel's key quota are not cached.
+    """
+
+    def __init__(
+        self,
+        service,
+        env,
+        ttl=CACHE_TTL,
+        keyring="session",
+        prefix="docker-credential-chamber",
+    ):
+        from .keyctl import Keyring, KeyctlUnavailable
+
+        try:
+            self.keyring = Keyring(keyring)
+        except (KeyctlUnavailable, OSError) as e:
+            raise CacheUnavailable(f"kernel keyring unavailable: {e}") from e
+        self.service = service
+        self.ttl = ttl
+        self.prefix = prefix
+        digest = sha256("\0".join([service] + _material(env)).encode())
+        self.namespace = digest.hexdigest()[:16]
+
+    def _description(self, key):
+        return f"{self.prefix}:{self.namespace}:{key}"
+
+    def get(self, key):
+        """return cached value for key or None if missing or expired"""
+        try:
+            key_id = self.keyring.search(self._description(key))
+            if key_id is None:
+                return None
+            return json.loads(self.keyring.read(key_id))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        try:
+            self.keyring.add(
+                self._description(key), json.dumps(value).encode(), self.ttl
+            )
+        except OSError:
+            # over quota or too large for a key
+            self.invalidate(key)
+
+    def invalidate(self, *keys):
+        for key in keys:
+            try:
+                key_id = self.keyring.search(self._description(key))
+                if key_id is not None:
+                    self.keyring.invalidate(key_id)
+            except OSError:
+                pass
+
+
+class MissCache(FileCache):
+    """remember keys with no stored credentials for ttl seconds
+
+    Entries are empty marker files aged by mtime; they hold no secrets so
+    they need no encryption key.
+    """
+
+    def __init__(self, service, ttl=MISS_TTL, size=CACHE_SIZE):
+        runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+        if not runtime_dir:
+            raise CacheUnavailable("XDG_RUNTIME_DIR is not set")
+        self.service = service
+        self.ttl = ttl
+        self.size = size
+        self.path = Path(runtime_dir) / "docker-credential-chamber" / "miss"
+        self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    def _file(self, key):
+        name = sha256(f"{self.service}\0{key}".encode()).hexdigest()
+        return self.path / f"miss-{name}"
+
+    def get(self, key):
+        """return True if key was recorded missing within ttl, else None"""
+        path = self._file(key)
+        try:
+            age = time.time() - path.stat().st_mtime
+        except OSError:
+            return None
+        if age > self.ttl:
+            self._unlink(path)
+            return None
+        return True
+
+    def put(self, key, value=True):
+        self._file(key).touch()
+        self._evict()
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self._unlink(self._file(key))
+
+
+class MemoryCache:
+    """in-process cache with the CredentialCache interface
+
+    Calls are serialized, as the daemon's requests and background refresh
+    share one instance from several threads.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored, value = entry
+            if time.monotonic() - stored > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
@@ -2,199 +2,38 @@
 
 import json
 import logging
-import os
+import signal
 import sys
-import time
-from base64 import b32decode, b32encode
-from pathlib import Path
-from subprocess import CalledProcessError, check_call, check_output
 
 import click
 
+from .backend import BACKENDS
+from .cache import (
+    CACHE_SIZE,
+    CACHE_STORES,
+    CACHE_TTL,
+    MISS_TTL,
+    REFRESH_AFTER,
+    MemoryCache,
+)
+from .config import load_config, save_config
+from .daemon import DaemonUnavailable, Server, default_socket, request
+from .dcc import (  # noqa: F401
+    DCC,
+    READBACK_DELAY,
+    READBACK_TIMEOUT,
+    WORKERS,
+    decode_key,
+    encode_server,
+)
+from .document import LAYOUTS
 from .exception_handler import ExceptionHandler
-
-ENABLE_LOGGING = False
-
-READBACK_TIMEOUT = 5
-
-
-def encode_server(server):
-    key = b32encode(server.encode()).decode()
-    key = key.replace("=", "_")
-    key = key.lower()
-    return key
-
-
-def decode_key(key):
-    key = key.replace("_", "=")
-    server_url = b32decode(key.encode().upper()).decode()
-    return server_url
-
-
-class DCC:
-    def __init__(
-        self,
-        service,
-        vault_token=None,
-        vault_addr=None,
-        chamber=None,
-        logger=None,
-    ):
-        self.service = service
-        self.vault_token = vault_token
-        self.vault_addr = vault_addr
-        self.chamber = chamber or "chamber"
-        if ENABLE_LOGGING:
-            self.logger = logger
-            self.debug(self._chamber_version())
-        else:
-            self.logger = None
-
-    def __str__(self):
-        return repr(self)
-
-    def __repr__(self):
-        return f"{self.__class__.__name__}:{Path(self.chamber).stem}"
-
-    def _chamber_version(self):
-        try:
-            version = check_output([self.chamber, "version"])
-        except CalledProcessError:
-            version = check_output([self.chamber, "--version"])
-        return f"{self.chamber} {version}"
-
-    def install(self):
-        config_dir = Path.home() / ".docker"
-        config_dir.mkdir(exist_ok=True)
-        config_file = config_dir / "config.json"
-        if config_file.is_file():
-            config = json.loads(config_file.read_text())
-        else:
-            config = {}
-        config["credsStore"] = "chamber"
-        config_file.write_text(json.dumps(config))
-
-    def info(self, msg, **kwargs):
-        if self.logger:
-            self.logger.info(f"{self}: {msg}", **kwargs)
-
-    def debug(self, msg, **kwargs):
-        if self.logger:
-            self.logger.debug(f"{self}: {msg}", **kwargs)
-
-    def error(self, msg, **kwargs):
-        if self.logger:
-            self.logger.error(f"{self}: {msg}", **kwargs)
-        sys.stderr.write(f"docker-credential-chamber: {msg}\n")
-
-    def _env(self):
-        ret = os.environ.copy()
-        if self.vault_token:
-            ret["VAULT_TOKEN"] = self.vault_token
-        if self.vault_addr:
-            ret["VAULT_ADDR"] = self.vault_addr
-        return ret
-
-    def get(self, server):
-        self.debug(f"get({server=})")
-        secrets = self.read()
-        ret = secrets.get(server, {})
-        if not ret:
-            self.server_not_found(server)
-        self.debug(f"get() -> {ret}")
-        return ret
-
-    def put(self, server, username, secret):
-        self.debug(f"put({server=} {username=} {secret=})")
-        current = self.read()
-        update = current.copy()
-        update[server] = {"Username": username, "Secret": secret}
-        self.write(update, current)
-
-    def list(self):
-        self.debug("list()")
-        secrets = self.read()
-        ret = {k: v["Username"] for k, v in secrets.items()}
-        self.debug(f"list() -> {ret}")
-        return ret
-
-    def delete(self, server):
-        self.debug(f"delete({server=})")
-        current = self.read()
-        if server in current.keys():
-            update = current.copy()
-            update.pop(server)
-            self.write(update, current)
-        else:
-            self.server_not_found(server)
-
-    def server_not_found(self, server):
-        self.error(
-            f"Service '{self.service}' contains no stored credentials for '{server}'"
-        )
-
-    def write(self, secrets, current):
-        if current is None:
-            current = self.read()
-
-        for server in current.keys():
-            if server not in secrets.keys():
-                cmd = [
-                    self.chamber,
-                    "delete",
-                    self.service,
-                    encode_server(server),
-                ]
-                self.debug(f"{cmd}")
-                check_call(cmd, env=self._env())
-        for server, creds in secrets.items():
-            cmd = [
-                self.chamber,
-                "write",
-                self.service,
-                encode_server(server),
-                json.dumps(creds),
-            ]
-            self.debug(f"write: {cmd}")
-            check_call(cmd, env=self._env())
-        self.verify(secrets)
-
-    def verify(self, secrets):
-        self.debug(f"verify({secrets=})")
-        timeout = time.time() + READBACK_TIMEOUT
-        while time.time() < timeout:
-            if self.read() == secrets:
-                self.debug("verify() -> True")
-                return True
-            else:
-                time.sleep(1)
-        self.error(
-            f"Readback failure writing credentials service '{self.service}'"
-        )
-        sys.exit(-1)
-
-    def read(self):
-        ret = {}
-        services = check_output(
-            [self.chamber, "list-services"], env=self._env()
-        ).decode()
-        services = services.split("\n")
-        # self.debug(f"_read() {services=}")
-        self.debug(
-            f"_read() {self.service} in services: {self.service in services}"
-        )
-        if self.service in services:
-            cmd = [self.chamber, "export", self.service]
-            self.debug(f"{cmd}")
-            data = check_output(cmd, env=self._env()).decode()
-            self.debug(f"_read: {data=}")
-            if len(data):
-                for key, creds in json.loads(data).items():
-                    if isinstance(creds, str):
-                        creds = json.loads(creds)
-                    ret[decode_key(key)] = creds
-        self.debug(f"_read() -> {ret}")
-        return ret
+from .importer import read_config, read_ndjson, strip_auths
+from .lock import LOCK_TIMEOUT
+from .ratelimit import BURST, RATE, RETRIES, RateLimiter
+from .registries import file_images, registries
+from .replica import HEDGE_DELAY
+from .trace import Tracer
 
 
 @click.group(name="docker-credential-chamber")
@@ -206,7 +45,16 @@ class DCC:
     show_envvar=True,
     envvar="DOCKER_CREDENTIALS_SERVICE",
     default="docker/credentials",
-    help="chamber service name to use for credential store",
+    help="chamber service for the credential store, or a ':'-separated "
+    "search path of services read in priority order",
+)
+@click.option(
+    "-W",
+    "--write-service",
+    type=str,
+    show_envvar=True,
+    envvar="DOCKER_CREDENTIALS_WRITE_SERVICE",
+    help="service of the search path changed by store/erase (default: first)",
 )
 @click.option(
     "-t",
@@ -232,6 +80,14 @@ class DCC:
     envvar="DOCKER_CREDENTIALS_LOGFILE",
     help="log to file",
 )
+@click.option(
+    "-T",
+    "--trace",
+    type=click.Path(dir_okay=False, writable=True),
+    show_envvar=True,
+    envvar="DOCKER_CREDENTIALS_TRACE",
+    help="append JSON-lines timing spans to file (also sent to --log-file)",
+)
 @click.option(
     "-L",
     "--log-level",
@@ -242,8 +98,194 @@ class DCC:
 @click.option(
     "-c", "--chamber", envvar="CHAMBER", show_envvar=True, default="chamber"
 )
+@click.option(
+    "-b",
+    "--backend",
+    type=click.Choice(BACKENDS),
+    envvar="DOCKER_CREDENTIALS_BACKEND",
+    show_envvar=True,
+    default="chamber",
+    help="storage backend: chamber binary, native vault/ssm API or memory",
+)
+@click.option(
+    "--layout",
+    type=click.Choice(LAYOUTS),
+    envvar="DOCKER_CREDENTIALS_LAYOUT",
+    show_envvar=True,
+    default="keys",
+    help="store a key per registry, or all credentials in one chunked "
+    "document (see 'migrate-layout')",
+)
+@click.option(
+    "-R",
+    "--replica",
+    "replicas",
+    multiple=True,
+    envvar="DOCKER_CREDENTIALS_REPLICAS",
+    show_envvar=True,
+    help="replica backend NAME[,VAR=VALUE...]: a backend name or chamber "
+    "binary with environment overrides; may be repeated",
+)
+@click.option(
+    "--hedge-delay",
+    type=click.FloatRange(min=0),
+    envvar="DOCKER_CREDENTIALS_HEDGE_DELAY",
+    show_envvar=True,
+    default=HEDGE_DELAY,
+    help="seconds to wait for the primary before also reading a replica",
+)
+@click.option(
+    "--readback-timeout",
+    type=float,
+    envvar="DOCKER_CREDENTIALS_READBACK_TIMEOUT",
+    show_envvar=True,
+    default=READBACK_TIMEOUT,
+    help="seconds to wait for written credentials to read back",
+)
+@click.option(
+    "--readback-delay",
+    type=float,
+    envvar="DOCKER_CREDENTIALS_READBACK_DELAY",
+    show_envvar=True,
+    default=READBACK_DELAY,
+    help="initial readback retry delay in seconds (doubles per retry)",
+)
+@click.option(
+    "--cache/--no-cache",
+    envvar="DOCKER_CREDENTIALS_CACHE",
+    show_envvar=True,
+    default=False,
+    help="cache credentials encrypted under $XDG_RUNTIME_DIR",
+)
+@click.option(
+    "--cache-ttl",
+    type=int,
+    envvar="DOCKER_CREDENTIALS_CACHE_TTL",
+    show_envvar=True,
+    default=CACHE_TTL,
+    help="seconds a cached credential remains valid",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    envvar="DOCKER_CREDENTIALS_CACHE_SIZE",
+    show_envvar=True,
+    default=CACHE_SIZE,
+    help="maximum cached entries (least recently used are evicted)",
+)
+@click.option(
+    "--refresh-after",
+    type=click.IntRange(min=0),
+    envvar="DOCKER_CREDENTIALS_REFRESH_AFTER",
+    show_envvar=True,
+    default=REFRESH_AFTER,
+    help="seconds after which cached credentials are refreshed in the "
+    "background while still served (0 disables)",
+)
+@click.option(
+    "--cache-store",
+    type=click.Choice(CACHE_STORES),
+    envvar="DOCKER_CREDENTIALS_CACHE_STORE",
+    show_envvar=True,
+    default="file",
+    help="keep cached credentials in encrypted files or a kernel keyring",
+)
+@click.option(
+    "--miss-ttl",
+    type=int,
+    envvar="DOCKER_CREDENTIALS_MISS_TTL",
+    show_envvar=True,
+    default=MISS_TTL,
+    help="seconds to remember servers without credentials (0 disables)",
+)
+@click.option(
+    "--single-flight/--no-single-flight",
+    envvar="DOCKER_CREDENTIALS_SINGLE_FLIGHT",
+    show_envvar=True,
+    default=False,
+    help="let concurrent 'get' processes for a server share one lookup",
+)
+@click.option(
+    "--lock-timeout",
+    type=float,
+    envvar="DOCKER_CREDENTIALS_LOCK_TIMEOUT",
+    show_envvar=True,
+    default=LOCK_TIMEOUT,
+    help="seconds to wait for the lock on whole-service changes",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    envvar="DOCKER_CREDENTIALS_WORKERS",
+    show_envvar=True,
+    default=WORKERS,
+    help="concurrent backend calls for multi-key operations",
+)
+@click.option(
+    "--rate",
+    type=click.FloatRange(min=0),
+    envvar="DOCKER_CREDENTIALS_RATE",
+    show_envvar=True,
+    default=RATE,
+    help="host-wide backend calls per second shared by all helper "
+    "processes (0 disables)",
+)
+@click.option(
+    "--burst",
+    type=click.IntRange(min=1),
+    envvar="DOCKER_CREDENTIALS_BURST",
+    show_envvar=True,
+    default=BURST,
+    help="backend calls allowed at once after an idle period",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    envvar="DOCKER_CREDENTIALS_RETRIES",
+    show_envvar=True,
+    default=RETRIES,
+    help="retries of backend calls refused by throttling",
+)
+@click.option(
+    "--socket",
+    type=click.Path(dir_okay=False),
+    envvar="DOCKER_CREDENTIALS_SOCKET",
+    show_envvar=True,
+    default=default_socket,
+    help="unix socket of the resident daemon (see 'serve')",
+)
 @click.pass_context
-def cli(ctx, debug, service, token, chamber, log_file, log_level):
+def cli(
+    ctx,
+    debug,
+    service,
+    write_service,
+    token,
+    chamber,
+    log_file,
+    trace,
+    log_level,
+    backend,
+    layout,
+    replicas,
+    hedge_delay,
+    readback_timeout,
+    readback_delay,
+    cache,
+    cache_ttl,
+    cache_size,
+    refresh_after,
+    cache_store,
+    miss_ttl,
+    single_flight,
+    lock_timeout,
+    workers,
+    rate,
+    burst,
+    retries,
+    socket,
+):
     """
     docker credential helper
 
@@ -261,10 +303,31 @@ def cli(ctx, debug, service, token, chamber, log_file, log_level):
     if debug:
         click.echo(f"{debug=}", err=True)
         click.echo(f"{service=}", err=True)
+        click.echo(f"{write_service=}", err=True)
         click.echo(f"{token=}", err=True)
         click.echo(f"{chamber=}", err=True)
         click.echo(f"{log_file=}", err=True)
+        click.echo(f"{trace=}", err=True)
         click.echo(f"{log_level=}", err=True)
+        click.echo(f"{backend=}", err=True)
+        click.echo(f"{layout=}", err=True)
+        click.echo(f"{replicas=}", err=True)
+        click.echo(f"{hedge_delay=}", err=True)
+        click.echo(f"{readback_timeout=}", err=True)
+        click.echo(f"{readback_delay=}", err=True)
+        click.echo(f"{cache=}", err=True)
+        click.echo(f"{cache_ttl=}", err=True)
+        click.echo(f"{cache_size=}", err=True)
+        click.echo(f"{refresh_after=}", err=True)
+        click.echo(f"{cache_store=}", err=True)
+        click.echo(f"{miss_ttl=}", err=True)
+        click.echo(f"{single_flight=}", err=True)
+        click.echo(f"{lock_timeout=}", err=True)
+        click.echo(f"{workers=}", err=True)
+        click.echo(f"{rate=}", err=True)
+        click.echo(f"{burst=}", err=True)
+        click.echo(f"{retries=}", err=True)
+        click.echo(f"{socket=}", err=True)
 
     if log_file:
         log_format = "%(levelname)s %(msg)s"
@@ -280,10 +343,53 @@ def cli(ctx, debug, service, token, chamber, log_file, log_level):
     logger.setLevel(log_level)
 
     handler = ExceptionHandler(debug, logger)  # noqa: F841
-    ctx.obj = DCC(service, vault_token=token, chamber=chamber, logger=logger)
+    ctx.obj = DCC(
+        service,
+        write_service=write_service,
+        vault_token=token,
+        chamber=chamber,
+        logger=logger,
+        backend=backend,
+        layout=layout,
+        replicas=replicas,
+        hedge_delay=hedge_delay,
+        readback_timeout=readback_timeout,
+        readback_delay=readback_delay,
+        cache=cache,
+        cache_ttl=cache_ttl,
+        cache_size=cache_size,
+        refresh_after=refresh_after,
+        cache_store=cache_store,
+        miss_ttl=miss_ttl,
+        single_flight=single_flight,
+        lock_timeout=lock_timeout,
+        workers=workers,
+        rate=rate,
+        burst=burst,
+        retries=retries,
+        trace=Tracer(trace, logger if log_file else None),
+    )
+    ctx.meta["socket"] = socket
     ctx.obj.info("startup")
 
 
+def forward(ctx, command, data):
+    """run a protocol command on the daemon if one is listening
+
+    returns (True, result) when the daemon handled the command, or
+    (False, None) when the caller should run it directly
+    """
+    try:
+        response = request(ctx.meta["socket"], ctx.obj.service, command, data)
+    except DaemonUnavailable as e:
+        ctx.obj.debug(f"daemon unavailable: {e}")
+        return False, None
+    sys.stderr.write(response["stderr"])
+    if response["exit"]:
+        sys.exit(response["exit"])
+    return True, response["result"]
+
+
 @cli.command()
 @click.argument("input", type=click.File("r"), default="-")
 @click.pass_context
@@ -292,7 +398,9 @@ def store(ctx, input):
     ctx.obj.debug(f"store  {input=}")
     data = input.read()
     config = json.loads(data)
-    ctx.obj.put(config["ServerURL"], config["Username"], config["Secret"])
+    forwarded, _ = forward(ctx, "store", config)
+    if not forwarded:
+        ctx.obj.put(config["ServerURL"], config["Username"], config["Secret"])
 
 
 @cli.command()
@@ -303,7 +411,10 @@ def get(ctx, input, output):
     """protocol command"""
     ctx.obj.debug(f"get {input=} {output=}")
     server_url = input.read().strip()
-    json.dump(ctx.obj.get(server_url), output)
+    forwarded, creds = forward(ctx, "get", server_url)
+    if not forwarded:
+        creds = ctx.obj.get(server_url)
+    json.dump(creds, output)
 
 
 @cli.command()
@@ -313,7 +424,9 @@ def erase(ctx, input):
     """protocol command"""
     ctx.obj.debug(f"erase {input=}")
     server_url = input.read().strip()
-    ctx.obj.delete(server_url)
+    forwarded, _ = forward(ctx, "erase", server_url)
+    if not forwarded:
+        ctx.obj.delete(server_url)
 
 
 @cli.command()
@@ -322,15 +435,151 @@ def erase(ctx, input):
 def list(ctx, output):
     """protocol command (undocumented)"""
     ctx.obj.debug(f"list {output=}")
-    json.dump(ctx.obj.list(), output)
+    forwarded, servers = forward(ctx, "list", None)
+    if not forwarded:
+        servers = ctx.obj.list()
+    json.dump(servers, output)
+
+
+@cli.command("import")
+@click.argument(
+    "input", type=click.Path(dir_okay=False, allow_dash=True), required=False
+)
+@click.option(
+    "--ndjson",
+    is_flag=True,
+    help="read ServerURL/Username/Secret records, one per line",
+)
+@click.option(
+    "--strip",
+    is_flag=True,
+    help="remove the imported plaintext auths from the config file",
+)
+@click.pass_context
+def import_(ctx, input, ndjson, strip):
+    """store credentials from config.json auths or an NDJSON stream
+
+    INPUT defaults to ~/.docker/config.json, or stdin with --ndjson
+    """
+    if input is None:
+        input = "-" if ndjson else str(ctx.obj.config_file())
+    ctx.obj.debug(f"import {input=} {ndjson=} {strip=}")
+    if strip and (ndjson or input == "-"):
+        raise click.UsageError("--strip requires a config.json file")
+    with click.open_file(input) as fp:
+        if ndjson:
+            secrets, skipped = read_ndjson(fp), []
+        else:
+            secrets, skipped = read_config(fp.read())
+    for server in skipped:
+        click.echo(f"skipped {server}: no stored credentials", err=True)
+    forwarded, _ = forward(ctx, "import", secrets)
+    if not forwarded:
+        ctx.obj.update(secrets)
+    click.echo(f"imported {len(secrets)} credentials", err=True)
+    if strip and secrets:
+        save_config(input, strip_auths(load_config(input), secrets))
+
+
+@cli.command("migrate-layout")
+@click.argument("layout", type=click.Choice(LAYOUTS))
+@click.pass_context
+def migrate_layout(ctx, layout):
+    """convert the stored credentials to LAYOUT
+
+    Credentials are readable in the new layout before they are removed from
+    the old one; switch clients to the matching --layout afterwards.
+    """
+    ctx.obj.debug(f"migrate-layout {layout=}")
+    servers = ctx.obj.migrate(layout)
+    click.echo(f"migrated {len(servers)} credentials to {layout}", err=True)
+
+
+@cli.command()
+@click.pass_context
+def ratelimit(ctx):
+    """show the host-wide rate limiter counters as JSON"""
+    dcc = ctx.obj
+    limiter = RateLimiter(str(dcc.backend), dcc.rate, dcc.burst)
+    click.echo(json.dumps(limiter.stats()))
+
+
+@cli.command()
+@click.argument("servers", nargs=-1)
+@click.option(
+    "-f",
+    "--file",
+    "files",
+    type=click.File("r"),
+    multiple=True,
+    help="Dockerfile or compose file naming the images to pull",
+)
+@click.pass_context
+def warm(ctx, servers, files):
+    """prefetch credentials into the cache or daemon before a build
+
+    SERVERS are registry names as docker passes them to 'get'
+    """
+    servers = list(servers)
+    for fp in files:
+        servers.extend(registries(file_images(fp.read())))
+    servers = list(dict.fromkeys(servers))
+    ctx.obj.debug(f"warm {servers=}")
+    if not servers:
+        raise click.UsageError("no registries given")
+    forwarded, missing = forward(ctx, "warm", servers)
+    if not forwarded:
+        if not (ctx.obj.cache or ctx.obj.misses):
+            raise click.ClickException(
+                "warm requires --cache, --miss-ttl or a running daemon"
+            )
+        missing = ctx.obj.warm(servers)
+    for server in missing:
+        click.echo(f"no stored credentials for {server}", err=True)
+    count = len(servers) - len(missing)
+    click.echo(f"warmed {count} of {len(servers)} registries", err=True)
 
 
 @cli.command()
+@click.option(
+    "--per-registry",
+    is_flag=True,
+    help="add credHelpers entries for each stored registry",
+)
+@click.option(
+    "--creds-store/--no-creds-store",
+    default=True,
+    show_default=True,
+    help="use this helper for all registries via credsStore",
+)
 @click.pass_context
-def install(ctx):
+def install(ctx, per_registry, creds_store):
     """configure this credental helper in ~/.docker/config.json"""
-    ctx.obj.debug("install")
-    ctx.obj.install()
+    ctx.obj.debug(f"install {per_registry=} {creds_store=}")
+    ctx.obj.install(per_registry=per_registry, creds_store=creds_store)
+
+
+@cli.command()
+@click.pass_context
+def serve(ctx):
+    """run a resident daemon serving the protocol commands"""
+    path = ctx.meta["socket"]
+    if not path:
+        raise click.UsageError("--socket or XDG_RUNTIME_DIR is required")
+    dcc = ctx.obj
+    dcc.cache = MemoryCache(ttl=dcc.cache_ttl, size=dcc.cache_size)
+    dcc.refresh_in = "thread"
+    if dcc.miss_ttl > 0:
+        dcc.misses = MemoryCache(ttl=dcc.miss_ttl, size=dcc.cache_size)
+    server = Server(path, dcc)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    dcc.info(f"serving on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 if __name__ == "__main__":
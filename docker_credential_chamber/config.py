@@ -0,0 +1,69 @@
+"""
+config
+
+read and atomically update docker's config.json
+"""
+
+import json
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+# name docker appends to 'docker-credential-' to run this helper
+HELPER = "chamber"
+
+
+def config_file():
+    return Path.home() / ".docker" / "config.json"
+
+
+def load_config(path):
+    path = Path(path)
+    if path.is_file():
+        return json.loads(path.read_text())
+    return {}
+
+
+def save_config(path, config):
+    """replace path with config via a temporary file and rename
+
+    A symlinked config, as kept in dotfile repositories, stays a symlink:
+    its target is the file replaced.
+    """
+    path = Path(path).resolve()
+    path.parent.mkdir(exist_ok=True)
+    try:
+        mode = path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o600
+    with NamedTemporaryFile(
+        "w", dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as fp:
+        json.dump(config, fp, indent="\t")
+    try:
+        os.chmod(fp.name, mode)
+        os.replace(fp.name, path)
+    except BaseException:
+        os.unlink(fp.name)
+        raise
+
+
+def sync_helpers(config, changes):
+    """update per-registry credHelpers for {server: creds or None} changes
+
+    Only applies once 'install --per-registry' has mapped some registry
+    to this helper; returns True if config was changed.
+    """
+    helpers = config.get("credHelpers", {})
+    if HELPER not in helpers.values():
+        return False
+    changed = False
+    for server, creds in changes.items():
+        if creds is None:
+            if helpers.get(server) == HELPER:
+                helpers.pop(server)
+                changed = True
+        elif helpers.get(server) != HELPER:
+            helpers[server] = HELPER
+            changed = True
+    return changed
@@ -0,0 +1,155 @@
+"""
+daemon
+
+resident server holding a warm DCC instance, and the client used by the
+protocol commands to reach it over a unix socket
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+from contextlib import redirect_stderr
+from pathlib import Path
+
+SOCKET_NAME = "daemon.sock"
+CONNECT_TIMEOUT = 1
+# seconds to wait for a response; a hung daemon must not block docker
+REQUEST_TIMEOUT = 30
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+def default_socket():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return str(
+            Path(runtime_dir) / "docker-credential-chamber" / SOCKET_NAME
+        )
+    return None
+
+
+def _get(dcc, data):
+    return dcc.get(data)
+
+
+def _store(dcc, data):
+    dcc.put(data["ServerURL"], data["Username"], data["Secret"])
+
+
+def _erase(dcc, data):
+    dcc.delete(data)
+
+
+def _list(dcc, data):
+    return dcc.list()
+
+
+def _import(dcc, data):
+    dcc.update(data)
+
+
+def _warm(dcc, data):
+    return dcc.warm(data)
+
+
+COMMANDS = {
+    "get": _get,
+    "store": _store,
+    "erase": _erase,
+    "list": _list,
+    "import": _import,
+    "warm": _warm,
+}
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.dispatch(request)
+        except ValueError as e:
+            response = {"unavailable": f"bad request: {e}"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.UnixStreamServer):
+    """serve protocol commands one at a time from a single DCC instance"""
+
+    def __init__(self, path, dcc):
+        self.dcc = dcc
+        path = Path(path)
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if path.exists():
+            try:
+                request(str(path), dcc.service, "ping", None)
+            except DaemonUnavailable:
+                path.unlink()
+            else:
+                raise RuntimeError(f"daemon already listening on {path}")
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), Handler)
+        finally:
+            os.umask(umask)
+
+    def dispatch(self, request):
+        if request.get("service") != self.dcc.service:
+            return {"unavailable": f"daemon serves '{self.dcc.service}'"}
+        command = request.get("command")
+        if command == "ping":
+            return {"result": None, "stderr": "", "exit": 0}
+        if command not in COMMANDS:
+            return {"unavailable": f"unknown command '{command}'"}
+        self.dcc.debug(f"daemon: {command}")
+        stderr = io.StringIO()
+        result = None
+        exit = 0
+        with redirect_stderr(stderr):
+            try:
+                result = COMMANDS[command](self.dcc, request.get("data"))
+            except SystemExit as e:
+                exit = e.code
+            except Exception as e:
+                stderr.write(f"{e.__class__.__name__}: {e}\n")
+                exit = -1
+        return {"result": result, "stderr": stderr.getvalue(), "exit": exit}
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def request(path, service, command, data, timeout=REQUEST_TIMEOUT):
+    """send a protocol command to the daemon; returns the response dict
+
+    raises DaemonUnavailable if no daemon can serve the request or it does
+    not answer within timeout seconds
+    """
+    if not path:
+        raise DaemonUnavailable("no socket path")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        sock.settimeout(timeout)
+        message = {"service": service, "command": command, "data": data}
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        with sock.makefile("rb") as fp:
+            line = fp.readline()
+    except OSError as e:
+        raise DaemonUnavailable(str(e)) from e
+    finally:
+        sock.close()
+    if not line:
+        raise DaemonUnavailable("connection closed")
+    response = json.loads(line)
+    if "unavailable" in response:
+        raise DaemonUnavailable(response["unavailable"])
+    return response
@@ -0,0 +1,805 @@
+"""
+dcc
+
+credential store logic behind the protocol commands
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from base64 import b32decode, b32encode
+from collections.abc import Mapping
+from hashlib import sha256
+
+from .backend import open_backend
+from .cache import (
+    CACHE_SIZE,
+    CACHE_TTL,
+    EXPORT,
+    MISS_TTL,
+    REFRESH_AFTER,
+    CacheUnavailable,
+    CredentialCache,
+    KeyringCache,
+    MissCache,
+)
+from .config import HELPER, config_file, load_config, save_config, sync_helpers
+from .document import DocumentBackend, migrate
+from .lock import LOCK_TIMEOUT, LockTimeout, ServiceLock
+from .ratelimit import BURST, RATE, RETRIES, LimitedBackend, RateLimiter
+from .replica import HEDGE_DELAY, ReplicatedBackend, open_replica
+from .singleflight import SingleFlight
+from .trace import TracedBackend, Tracer, traced
+
+ENABLE_LOGGING = False
+
+READBACK_TIMEOUT = 5
+READBACK_DELAY = 0.05
+READBACK_BACKOFF = 2
+READBACK_MAX_DELAY = 1
+
+# concurrent backend calls for multi-key operations
+WORKERS = 4
+
+# separates the services of a search path
+SERVICE_SEPARATOR = ":"
+
+
+def encode_server(server):
+    key = b32encode(server.encode()).decode()
+    key = key.replace("=", "_")
+    key = key.lower()
+    return key
+
+
+def decode_key(key):
+    key = key.replace("_", "=")
+    server_url = b32decode(key.encode().upper()).decode()
+    return server_url
+
+
+class ChangeError(Exception):
+    """one or more keys of a multi-key change failed"""
+
+    def __init__(self, errors, total):
+        self.errors = errors
+        details = "; ".join(f"{k}: {e}" for k, e in errors.items())
+        super().__init__(f"failed {len(errors)} of {total} keys: {details}")
+
+
+def _parse(creds):
+    return json.loads(creds) if isinstance(creds, str) else creds
+
+
+class Exported(Mapping):
+    """read-only {server: creds} view over a raw backend export
+
+    The export stays indexed by encoded key; a lookup encodes the server
+    and parses only that entry, and keys are decoded only when iterated.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __getitem__(self, server):
+        return _parse(self.data[encode_server(server)])
+
+    def __contains__(self, server):
+        return encode_server(server) in self.data
+
+    def __iter__(self):
+        return map(decode_key, self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def usernames(self):
+        """return {server: username} keeping no secrets"""
+        return {
+            decode_key(key): _parse(creds)["Username"]
+            for key, creds in self.data.items()
+        }
+
+
+class DCC:
+    def __init__(
+        self,
+        service,
+        vault_token=None,
+        vault_addr=None,
+        chamber=None,
+        logger=None,
+        backend=None,
+        readback_timeout=READBACK_TIMEOUT,
+        readback_delay=READBACK_DELAY,
+        cache=False,
+        cache_ttl=CACHE_TTL,
+        cache_size=CACHE_SIZE,
+        cache_store="file",
+        lock_timeout=LOCK_TIMEOUT,
+        workers=WORKERS,
+        trace=None,
+        miss_ttl=MISS_TTL,
+        write_service=None,
+        rate=RATE,
+        burst=BURST,
+        retries=RETRIES,
+        single_flight=False,
+        replicas=(),
+        hedge_delay=HEDGE_DELAY,
+        refresh_after=REFRESH_AFTER,
+        layout="keys",
+    ):
+        # service may be a search path of services separated by ':'
+        self.service = service
+        self.services = service.split(SERVICE_SEPARATOR)
+        self.write_service = write_service or self.services[0]
+        if self.write_service not in self.services:
+            raise ValueError(
+                f"write service '{self.write_service}' is not in '{service}'"
+            )
+        self.vault_token = vault_token
+        self.vault_addr = vault_addr
+        self.chamber = chamber or "chamber"
+        self.tracer = trace if isinstance(trace, Tracer) else Tracer(trace)
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.replicas = list(replicas)
+        self.hedge_delay = hedge_delay
+        self.layout = layout
+        self.lock_timeout = lock_timeout
+        self.backends = self._open_backends(backend)
+        self.backend = self.backends[self.write_service]
+        self.readback_timeout = readback_timeout
+        self.readback_delay = readback_delay
+        self.workers = workers
+        if ENABLE_LOGGING:
+            self.logger = logger
+            self.debug(self.backend.version())
+        else:
+            self.logger = None
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.cache_store = cache_store
+        self.refresh_after = refresh_after
+        # where refresh runs: "process", "thread" or "inline"
+        self.refresh_in = "process"
+        self.cache = None
+        if cache:
+            try:
+                self.cache = self._open_cache()
+            except CacheUnavailable as e:
+                self.warning(f"--cache disabled: {e}")
+        self.flight = self._open_flight(lock_timeout) if single_flight else None
+        self.miss_ttl = miss_ttl
+        self.misses = None
+        if miss_ttl > 0:
+            try:
+                self.misses = MissCache(service, ttl=miss_ttl, size=cache_size)
+            except CacheUnavailable as e:
+                self.debug(f"miss cache disabled: {e}")
+
+    def _open_backends(self, backend):
+        """return {service: backend} for the search path
+
+        backend is a backend name, an instance for a single service or a
+        {service: instance} dict
+        """
+        if backend is None or isinstance(backend, str):
+            backend = {
+                name: self._open_service(backend or "chamber", name)
+                for name in self.services
+            }
+        else:
+            if not isinstance(backend, dict):
+                if len(self.services) > 1:
+                    raise ValueError(
+                        "a backend instance serves a single service"
+                    )
+                backend = {self.service: backend}
+            backend = {k: self._wrapped(v) for k, v in backend.items()}
+        # per-key views of the services, whatever the layout
+        self.stores = backend
+        if self.layout == "document":
+            backend = {
+                k: DocumentBackend(v, self.lock_timeout)
+                for k, v in backend.items()
+            }
+        return backend
+
+    def _open_service(self, name, service):
+        """return the backend for service, replicated if so configured"""
+        env = self._env()
+        primary = self._wrapped(
+            open_backend(name, service, env, chamber=self.chamber)
+        )
+        if not self.replicas:
+            return primary
+        replicas = [
+            self._wrapped(open_replica(spec, service, env, self.chamber))
+            for spec in self.replicas
+        ]
+        return ReplicatedBackend(
+            primary, replicas, self.hedge_delay, self.tracer
+        )
+
+    def _wrapped(self, backend):
+        """return a storage backend traced and rate limited as configured
+
+        Tracing goes innermost, so each call that reaches a backend is
+        counted once, including those made by replication and layouts.
+        """
+        if self.tracer.enabled:
+            backend = TracedBackend(backend, self.tracer)
+        if self.rate > 0 or self.retries > 0:
+            limiter = self.limiter(str(backend))
+            return LimitedBackend(backend, limiter, self.retries, self.tracer)
+        return backend
+
+    def _open_cache(self):
+        if self.cache_store == "file":
+            return CredentialCache(
+                self.service,
+                self._env(),
+                ttl=self.cache_ttl,
+                size=self.cache_size,
+            )
+        return KeyringCache(
+            self.service,
+            self._env(),
+            ttl=self.cache_ttl,
+            keyring=self.cache_store.removesuffix("-keyring"),
+        )
+
+    def _open_flight(self, lock_timeout):
+        # results are only handed over in a keyring the user chose
+        flight = SingleFlight(
+            self.service,
+            self._env(),
+            lock_timeout,
+            keyring=(
+                None
+                if self.cache_store == "file"
+                else self.cache_store.removesuffix("-keyring")
+            ),
+        )
+        # waiters with nowhere to find the result would each read the
+        # backend in turn, slower than not waiting at all
+        if self.cache or flight.handoff:
+            return flight
+        self.warning(
+            "single flight disabled: it needs --cache or a keyring "
+            "--cache-store to share results"
+        )
+        return None
+
+    def limiter(self, name):
+        """return the host-wide rate limiter for a backend type or None"""
+        if self.rate > 0:
+            return RateLimiter(name, self.rate, self.burst)
+        return None
+
+    def __str__(self):
+        return repr(self)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}:{self.backend}"
+
+    def config_file(self):
+        return config_file()
+
+    def install(self, per_registry=False, creds_store=True):
+        """configure docker to use this helper
+
+        With per_registry, map each stored server to this helper in
+        credHelpers; without creds_store, stop using it for the rest.
+        """
+        path = self.config_file()
+        config = load_config(path)
+        if creds_store:
+            config["credsStore"] = HELPER
+        elif config.get("credsStore") == HELPER:
+            config.pop("credsStore")
+        if per_registry:
+            helpers = {
+                server: helper
+                for server, helper in config.get("credHelpers", {}).items()
+                if helper != HELPER
+            }
+            helpers.update({server: HELPER for server in self.list()})
+            config["credHelpers"] = helpers
+        save_config(path, config)
+
+    def sync_helpers(self, changes):
+        """keep per-registry credHelpers in step with stored servers"""
+        path = self.config_file()
+        config = load_config(path)
+        if sync_helpers(config, changes):
+            self.debug(f"sync_helpers: updating {path}")
+            save_config(path, config)
+
+    def info(self, msg, **kwargs):
+        if self.logger:
+            self.logger.info(f"{self}: {msg}", **kwargs)
+
+    def debug(self, msg, **kwargs):
+        if self.logger:
+            self.logger.debug(f"{self}: {msg}", **kwargs)
+
+    def warning(self, msg, **kwargs):
+        if self.logger:
+            self.logger.warning(f"{self}: {msg}", **kwargs)
+        sys.stderr.write(f"docker-credential-chamber: {msg}\n")
+
+    def error(self, msg, **kwargs):
+        if self.logger:
+            self.logger.error(f"{self}: {msg}", **kwargs)
+        sys.stderr.write(f"docker-credential-chamber: {msg}\n")
+
+    def _env(self):
+        ret = os.environ.copy()
+        if self.vault_token:
+            ret["VAULT_TOKEN"] = self.vault_token
+        if self.vault_addr:
+            ret["VAULT_ADDR"] = self.vault_addr
+        return ret
+
+    @traced
+    def get(self, server):
+        self.debug(f"get({server=})")
+        key = encode_server(server)
+        ret = self._cached(key)
+        if ret is None and self.flight:
+            ret, shared = self.flight.run(
+                key, lambda: self._fetch(server, key), lambda: self._cached(key)
+            )
+            if shared:
+                self.debug("get: coalesced")
+                self.tracer.count("coalesced")
+        elif ret is None:
+            ret = self._fetch(server, key)
+        if not ret:
+            self.server_not_found(server)
+        self.debug(f"get() -> {ret}")
+        return ret
+
+    def _cached(self, key):
+        ret = self._cache_get(key)
+        if ret is None and self.misses and self.misses.get(key):
+            self.debug("get: cached miss")
+            ret = {}
+        return ret
+
+    def _fetch(self, server, key):
+        """look server up, caching the result
+
+        A miss is only recorded once the lookup succeeded: a backend error
+        propagates and leaves nothing cached.
+        """
+        ret = self._read_server(server)
+        if ret:
+            self._cache_put(key, ret)
+        elif self.misses:
+            self.misses.put(key, True)
+        return ret
+
+    def _read_server(self, server):
+        ret = self._lookup(server)
+        if ret is None:
+            ret = self._search_export().get(server, {})
+        return ret
+
+    def _cache_get(self, key):
+        """return the cached value for key
+
+        Entries older than refresh_after are still returned, and are
+        refreshed in the background.
+        """
+        entry = self.cache.get(key) if self.cache else None
+        if not isinstance(entry, dict) or "value" not in entry:
+            return None
+        if (
+            self.refresh_after
+            and time.time() - entry["at"] > self.refresh_after
+        ):
+            self.tracer.count("stale")
+            self.refresh([key])
+        return entry["value"]
+
+    def _cache_put(self, key, value, version=None):
+        if self.cache:
+            entry = {"value": value, "at": time.time(), "version": version}
+            self.cache.put(key, entry)
+
+    @traced
+    def put(self, server, username, secret):
+        """store creds for server, touching only its own key"""
+        self.debug(f"put({server=} {username=} {secret=})")
+        creds = {"Username": username, "Secret": secret}
+        if self._read_key(server) == creds:
+            self.debug("put: unchanged")
+            return
+        self.apply({server: creds})
+
+    @traced
+    def update(self, secrets):
+        """store {server: creds} with one write pass and one readback
+
+        The read, compare and write run under the service lock, so
+        concurrent imports do not act on each other's stale reads.
+        Returns the seconds waited for the lock.
+        """
+        self.debug(f"update({len(secrets)} servers)")
+        with self.tracer.span("lock") as span:
+            lock = self.lock().acquire()
+            span["waited"] = round(lock.waited, 6)
+        try:
+            self.info(f"update: waited {lock.waited:.3f}s for service lock")
+            current = self.read()
+            self.apply(
+                {s: c for s, c in secrets.items() if current.get(s) != c}
+            )
+        finally:
+            lock.release()
+        return lock.waited
+
+    @traced
+    def warm(self, servers):
+        """fill the caches for servers from a single export
+
+        returns the servers with no stored credentials
+        """
+        self.debug(f"warm({servers=})")
+        exported = self._search_export()
+        missing = []
+        for server in servers:
+            key = encode_server(server)
+            creds = exported.get(server)
+            if creds:
+                self._cache_put(key, creds)
+            else:
+                missing.append(server)
+                if self.misses:
+                    self.misses.put(key, True)
+        return missing
+
+    @traced
+    def list(self):
+        self.debug("list()")
+        ret = self._cache_get(EXPORT)
+        if ret is None:
+            ret = self._search_export().usernames()
+            self._cache_put(EXPORT, ret)
+        self.debug(f"list() -> {ret}")
+        return ret
+
+    @traced
+    def delete(self, server):
+        """remove creds for server, touching only its own key"""
+        self.debug(f"delete({server=})")
+        if self._read_key(server) is None and server not in self._export():
+            self.server_not_found(server)
+        else:
+            self.apply({server: None})
+
+    def refresh(self, keys):
+        """revalidate cached keys in the background
+
+        One refresh of a service runs at a time across processes: its lock
+        passes to a forked child, or to a thread in the daemon, and callers
+        finding it taken leave the refresh to the holder.  After a failed
+        refresh, none is started for refresh_after seconds.
+        """
+        lock = ServiceLock(f"{self.service}\0refresh", timeout=0)
+        try:
+            failed = lock.path.with_suffix(".failed").stat().st_mtime
+        except FileNotFoundError:
+            failed = 0
+        if time.time() - failed < self.refresh_after:
+            self.tracer.count("refresh_backoff")
+            return
+        try:
+            lock.acquire()
+        except LockTimeout:
+            return
+        if self.refresh_in == "thread":
+            threading.Thread(
+                target=self._refresh, args=(lock, keys), daemon=True
+            ).start()
+        elif self.refresh_in == "process":
+            self._detach(lock, keys)
+        else:
+            self._refresh(lock, keys)
+
+    def _detach(self, lock, keys):
+        try:
+            pid = os.fork()
+        except OSError as e:
+            self.debug(f"refresh skipped: {e}")
+            lock.release()
+            return
+        if pid:
+            # closing our descriptor leaves the lock to the child
+            os.close(lock.fd)
+            lock.fd = None
+            return
+        try:
+            # docker reads the helper's output until every copy is closed
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in range(3):
+                os.dup2(devnull, fd)
+            self._refresh(lock, keys)
+        finally:
+            os._exit(0)
+
+    def _refresh(self, lock, keys):
+        failed = lock.path.with_suffix(".failed")
+        try:
+            self.revalidate(keys)
+            failed.unlink(missing_ok=True)
+        except Exception as e:
+            # the stale entries are still served; retry later, not per get
+            self.debug(f"refresh failed: {e}")
+            failed.touch(mode=0o600)
+        finally:
+            lock.release()
+
+    @traced
+    def revalidate(self, keys):
+        """refresh cached keys, re-reading only those whose version changed"""
+        results, errors = self.fan_out(
+            lambda name: self.backends[name].versions(), self.services
+        )
+        versions = None if errors else results
+        for key in keys:
+            entry = self.cache.get(key) if self.cache else None
+            if not isinstance(entry, dict):
+                continue
+            version = self._version(versions, key)
+            if version is not None and version == entry.get("version"):
+                self.tracer.count("unchanged")
+                self._cache_put(key, entry["value"], version)
+                continue
+            self.tracer.count("refreshed")
+            if key == EXPORT:
+                value = self._search_export().usernames()
+            else:
+                value = self._read_server(decode_key(key))
+            if value:
+                self._cache_put(key, value, version)
+            else:
+                self.cache.invalidate(key)
+
+    def _version(self, versions, key):
+        """return what identifies the current value of key, or None"""
+        if versions is None or None in versions.values():
+            return None
+        if key == EXPORT:
+            data = json.dumps([versions[name] for name in self.services])
+            return sha256(data.encode()).hexdigest()
+        for name in self.services:
+            if key in versions[name]:
+                return [name, versions[name][key]]
+        return [None, None]
+
+    def server_not_found(self, server):
+        self.error(
+            f"Service '{self.service}' contains no stored credentials for '{server}'"
+        )
+
+    def lock(self):
+        return ServiceLock(self.write_service, self.lock_timeout)
+
+    @traced
+    def migrate(self, layout):
+        """convert the write service to layout; returns the servers moved"""
+        with self.lock():
+            keys = migrate(
+                self.stores[self.write_service], layout, self.lock_timeout
+            )
+        return [decode_key(key) for key in keys]
+
+    def apply(self, changes):
+        """write {server: creds} changes; creds of None deletes the key
+
+        Keys are changed concurrently; failures are collected per key and
+        raised as one ChangeError after the others are verified.
+        """
+        self.debug(f"apply: {len(changes)} keys changed")
+
+        def _change(server):
+            if changes[server] is None:
+                self._delete_key(server)
+            else:
+                self._write_key(server, changes[server])
+
+        if self.backend.batched:
+            errors = self._write_batch(changes)
+        else:
+            _, errors = self.fan_out(_change, changes)
+        if self.cache and changes:
+            self.cache.invalidate(EXPORT, *map(encode_server, changes))
+        if self.misses and changes:
+            self.misses.invalidate(*map(encode_server, changes))
+        if self.flight and changes:
+            self.flight.invalidate(*map(encode_server, changes))
+        written = {k: v for k, v in changes.items() if k not in errors}
+        if written:
+            self.verify(written)
+            self.sync_helpers(written)
+        if errors:
+            raise ChangeError(errors, len(changes))
+
+    def _write_batch(self, changes):
+        """write changes in one backend call; returns {server: exception}"""
+        try:
+            self.backend.write_keys(
+                {
+                    encode_server(server): (
+                        None if creds is None else json.dumps(creds)
+                    )
+                    for server, creds in changes.items()
+                }
+            )
+        except Exception as e:
+            return {server: e for server in changes}
+        return {}
+
+    def _read_keys(self, servers):
+        """return ({server: creds or None}, {server: exception})"""
+        if not self.backend.batched:
+            return self.fan_out(self._read_key, servers)
+        try:
+            exported = self.backend.export()
+        except Exception as e:
+            return {}, {server: e for server in servers}
+        results = {}
+        for server in servers:
+            value = exported.get(encode_server(server))
+            results[server] = None if value is None else json.loads(value)
+        return results, {}
+
+    def fan_out(self, func, servers):
+        """call func(server) for each server on up to self.workers threads
+
+        returns ({server: result}, {server: exception})
+        """
+        results = {}
+        errors = {}
+        workers = min(self.workers, len(servers))
+        if workers <= 1:
+            for server in servers:
+                try:
+                    results[server] = func(server)
+                except Exception as e:
+                    errors[server] = e
+            return results, errors
+        # concurrent.futures imports logging; keep it off the fast path
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(func, server): server for server in servers}
+            for future in as_completed(futures):
+                server = futures[future]
+                try:
+                    results[server] = future.result()
+                except Exception as e:
+                    errors[server] = e
+        return results, errors
+
+    def _write_key(self, server, creds):
+        key = encode_server(server)
+        self.debug(f"write: {key}")
+        self.backend.write_key(key, json.dumps(creds))
+
+    def _delete_key(self, server):
+        key = encode_server(server)
+        self.debug(f"delete: {key}")
+        self.backend.delete_key(key)
+
+    @traced
+    def verify(self, changes):
+        """poll the changed keys until they read back as written
+
+        Retries use exponential backoff with jitter starting at
+        readback_delay seconds; returns (attempts, elapsed_seconds)
+        """
+        self.debug(f"verify({changes=})")
+        start = time.monotonic()
+        deadline = start + self.readback_timeout
+        delay = self.readback_delay
+        pending = dict(changes)
+        attempts = 0
+        while True:
+            attempts += 1
+            if attempts > 1:
+                self.tracer.count("retries")
+            with self.tracer.span("verify.attempt", keys=len(pending)):
+                current, errors = self._read_keys(pending)
+            pending = {
+                server: creds
+                for server, creds in pending.items()
+                if server in errors or current[server] != creds
+            }
+            elapsed = time.monotonic() - start
+            if not pending:
+                self.info(f"verify: {attempts=} {elapsed=:.3f}")
+                return attempts, elapsed
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, delay / 2 + random.uniform(0, delay / 2)))
+            delay = min(delay * READBACK_BACKOFF, READBACK_MAX_DELAY)
+        self.error(
+            f"Readback failure writing credentials service '{self.service}' "
+            f"after {attempts} attempts in {elapsed:.3f} seconds"
+        )
+        sys.exit(-1)
+
+    def _read_key(self, server, service=None):
+        """return stored creds for server or None if not present
+
+        reads the write service unless another service is given
+        """
+        backend = self.backends[service] if service else self.backend
+        value = backend.read_key(encode_server(server))
+        self.debug(f"_read_key({server=}) -> {value is not None}")
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def _first(self, results, errors):
+        """return the result of the first service in the search path to
+        hold one, raising an error from any service searched before it
+        """
+        for service in self.services:
+            if service in errors:
+                raise errors[service]
+            if results[service] is not None:
+                return results[service]
+        return None
+
+    def _lookup(self, server):
+        """return creds for server from the search path or None"""
+        if len(self.services) == 1:
+            return self._read_key(server)
+        results, errors = self.fan_out(
+            lambda service: self._read_key(server, service), self.services
+        )
+        return self._first(results, errors)
+
+    def _search_export(self):
+        """return an Exported view merging the search path by priority"""
+        if len(self.services) == 1:
+            return self._export()
+        results, errors = self.fan_out(
+            lambda service: self.backends[service].export(), self.services
+        )
+        merged = {}
+        for service in reversed(self.services):
+            if service in errors:
+                raise errors[service]
+            merged.update(results[service])
+        self.debug(f"_search_export: {len(merged)} keys")
+        return Exported(merged)
+
+    def read(self):
+        """return all stored creds
+
+        A missing service reads as empty; backend failures are raised so
+        list, update and delete never act on a wrongly empty service.
+        """
+        ret = self._export()
+        self.debug(f"read() -> {len(ret)} servers")
+        return ret
+
+    def _export(self):
+        """return a lazy {server: creds} view of the exported service"""
+        data = self.backend.export()
+        self.debug(f"_export: {len(data)} keys")
+        return Exported(data)
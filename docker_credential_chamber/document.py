@@ -0,0 +1,201 @@
+"""
+document
+
+single-document storage layout
+
+Instead of one key per registry, all keys of a service are kept in one
+JSON document, so reading them takes a single export however many
+registries there are.  The document is split into chunks that fit the
+backend's value size limit, stored under keys named for a random id of
+that write, and a header key records the id, version, chunk count and
+digest:
+
+    _doc            {"layout": 1, "version": 3, "id": "9f2c...", ...}
+    _doc_9f2c..._0  first chunk
+    _doc_9f2c..._1  second chunk
+
+A new version's chunks are written before the header pointing to them,
+and the chunks of the version it replaces are deleted after it, so a
+reader sees one version or the other; an export mixing them fails the
+digest check and is retried.
+
+Changes read, modify and rewrite the document from the primary backend
+under a per-service lock.  The lock only covers one host, so before the
+header is written it is read again: if another writer replaced it in the
+meantime, the change is dropped and redone on the new document.
+"""
+
+import json
+import secrets
+import time
+from hashlib import sha256
+
+from .backend import Backend, BackendError
+from .lock import LOCK_TIMEOUT, ServiceLock
+
+LAYOUTS = ["keys", "document"]
+
+HEADER = "_doc"
+
+# SSM standard parameters hold at most 4096 characters
+CHUNK_SIZE = 4000
+
+READ_RETRIES = 5
+READ_DELAY = 0.1
+# attempts at a change racing writers on other hosts
+WRITE_RETRIES = 5
+
+
+def _chunk_keys(header):
+    # documents written before ids were recorded name chunks by version
+    name = header.get("id", header["version"])
+    return [f"{HEADER}_{name}_{i}" for i in range(header["chunks"])]
+
+
+def _assemble(data):
+    """return (document, header) from exported keys
+
+    document is None if the chunks do not match the header
+    """
+    if HEADER not in data:
+        return {}, None
+    header = json.loads(data[HEADER])
+    try:
+        text = "".join(data[key] for key in _chunk_keys(header))
+    except KeyError:
+        return None, header
+    if sha256(text.encode()).hexdigest() != header["sha256"]:
+        return None, header
+    return json.loads(text), header
+
+
+class DocumentBackend(Backend):
+    """the keys of a service kept as one document in another backend"""
+
+    batched = True
+
+    def __init__(self, store, lock_timeout=LOCK_TIMEOUT, chunk_size=CHUNK_SIZE):
+        super().__init__(store.service)
+        self.store = store
+        # a replica's copy may be stale, so changes start from the primary
+        self.primary = getattr(store, "primary", store)
+        self.lock_timeout = lock_timeout
+        self.chunk_size = chunk_size
+        self.spawns_per_call = store.spawns_per_call
+
+    def __str__(self):
+        return str(self.store)
+
+    def version(self):
+        return f"{self.store.version()} (document layout)"
+
+    def _load(self, store=None):
+        """return (document, header) from one export
+
+        A service without a header is an empty document; a failed export
+        raises.
+        """
+        delay = READ_DELAY
+        for _ in range(READ_RETRIES):
+            document, header = _assemble((store or self.store).export())
+            if document is not None:
+                return document, header
+            # torn by a concurrent change or not yet consistent
+            time.sleep(delay)
+            delay *= 2
+        raise BackendError(f"inconsistent document in '{self.service}'")
+
+    def _save(self, document, header):
+        """replace the document header describes with document
+
+        Returns False, leaving the stored document as it was, if another
+        writer replaced the header since it was read.
+        """
+        keys = []
+        if document:
+            text = json.dumps(document, sort_keys=True, separators=(",", ":"))
+            bounds = [*range(0, len(text), self.chunk_size), len(text)]
+            chunks = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+            new = dict(
+                layout=1,
+                version=header["version"] + 1 if header else 1,
+                id=secrets.token_hex(8),
+                chunks=len(chunks),
+                sha256=sha256(text.encode()).hexdigest(),
+            )
+            keys = _chunk_keys(new)
+            for key, chunk in zip(keys, chunks):
+                self.store.write_key(key, chunk)
+        current = self.primary.read_key(HEADER)
+        if (json.loads(current) if current else None) != header:
+            for key in keys:
+                self.store.delete_key(key)
+            return False
+        if document:
+            self.store.write_key(HEADER, json.dumps(new))
+        elif header:
+            # header first: readers then see an empty service
+            self.store.delete_key(HEADER)
+        for key in _chunk_keys(header) if header else []:
+            try:
+                self.store.delete_key(key)
+            except BackendError:
+                # already removed by a writer that raced this one
+                pass
+        return True
+
+    def write_keys(self, changes):
+        with ServiceLock(f"{self.service}\0document", self.lock_timeout):
+            delay = READ_DELAY
+            for _ in range(WRITE_RETRIES):
+                document, header = self._load(self.primary)
+                for key, value in changes.items():
+                    if value is None:
+                        document.pop(key, None)
+                    else:
+                        document[key] = value
+                if self._save(document, header):
+                    return
+                time.sleep(delay)
+                delay *= 2
+        raise BackendError(f"concurrent changes to '{self.service}' conflict")
+
+    def read_key(self, key):
+        return self._load()[0].get(key)
+
+    def write_key(self, key, value):
+        self.write_keys({key: value})
+
+    def delete_key(self, key):
+        self.write_keys({key: None})
+
+    def export(self):
+        return self._load()[0]
+
+    def exists(self):
+        return bool(self._load()[0])
+
+
+def migrate(store, layout, lock_timeout=LOCK_TIMEOUT):
+    """convert the keys of store to layout; returns the keys moved
+
+    The target layout is written completely before the source is removed,
+    so clients on either layout keep finding the credentials.
+    """
+    document = DocumentBackend(store, lock_timeout)
+    if layout == "document":
+        keys = {
+            k: v for k, v in store.export().items() if not k.startswith(HEADER)
+        }
+        if keys:
+            document.write_keys(keys)
+            for key in keys:
+                store.delete_key(key)
+    elif layout == "keys":
+        keys = document.export()
+        for key, value in keys.items():
+            store.write_key(key, value)
+        document.write_keys(dict.fromkeys(keys))
+    else:
+        raise BackendError(f"unknown layout '{layout}'")
+    return sorted(keys)
@@ -0,0 +1,91 @@
+"""
+httppool
+
+keep-alive HTTP connection pool for the native backends
+"""
+
+import http.client
+import ssl
+import threading
+from urllib.parse import urlsplit
+
+# errors indicating an idle pooled connection was closed by the server
+STALE_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class ConnectionPool:
+    """reuse connections to one base URL across requests and threads"""
+
+    def __init__(self, base_url, ssl_context=None, timeout=30):
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip("/")
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+        self.connections = 0
+
+    def _connect(self):
+        self.connections += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host,
+                self.port,
+                timeout=self.timeout,
+                context=self.ssl_context or ssl.create_default_context(),
+            )
+        return http.client.HTTPConnection(
+            self.host, self.port, timeout=self.timeout
+        )
+
+    def _checkout(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self._connect(), False
+
+    def _checkin(self, conn):
+        with self.lock:
+            self.idle.append(conn)
+
+    @property
+    def netloc(self):
+        return self.host if self.port is None else f"{self.host}:{self.port}"
+
+    def request(self, method, path, body=None, headers=None):
+        """return (status, body_bytes) for the request"""
+        conn, reused = self._checkout()
+        while True:
+            try:
+                conn.request(method, self.prefix + path, body, headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except STALE_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                # the server closed an idle connection; retry on a new one
+                conn, reused = self._connect(), False
+                continue
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            return response.status, data
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
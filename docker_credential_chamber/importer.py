@@ -0,0 +1,82 @@
+"""
+importer
+
+read credentials for bulk import from a docker config.json or an NDJSON
+stream of credential helper store records
+"""
+
+import json
+from base64 import b64decode
+
+# docker's Username for an identity token stored by a credential helper
+IDENTITY_TOKEN_USER = "<token>"
+
+
+class ImportDataError(ValueError):
+    pass
+
+
+def _auth_creds(server, auth):
+    if auth.get("identitytoken"):
+        return {
+            "Username": IDENTITY_TOKEN_USER,
+            "Secret": auth["identitytoken"],
+        }
+    if auth.get("auth"):
+        try:
+            username, _, secret = (
+                b64decode(auth["auth"]).decode().partition(":")
+            )
+        except ValueError as e:
+            raise ImportDataError(f"bad auth for '{server}': {e}") from e
+        return {"Username": username, "Secret": secret}
+    if auth.get("username") and auth.get("password"):
+        return {"Username": auth["username"], "Secret": auth["password"]}
+    return None
+
+
+def read_config(data):
+    """return ({server: creds}, skipped) from the auths of a config.json
+
+    skipped lists servers whose entry holds no credentials, as written by
+    docker when a credential store is configured
+    """
+    secrets = {}
+    skipped = []
+    for server, auth in json.loads(data).get("auths", {}).items():
+        creds = _auth_creds(server, auth)
+        if creds is None:
+            skipped.append(server)
+        else:
+            secrets[server] = creds
+    return secrets, skipped
+
+
+def read_ndjson(lines):
+    """return {server: creds} from ServerURL/Username/Secret records"""
+    secrets = {}
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            server = record["ServerURL"]
+            secrets[server] = {
+                "Username": record["Username"],
+                "Secret": record["Secret"],
+            }
+        except (ValueError, KeyError, TypeError) as e:
+            raise ImportDataError(f"bad record on line {number}: {e}") from e
+    return secrets
+
+
+def strip_auths(config, servers):
+    """return config with the plaintext auths for servers removed"""
+    config = dict(config)
+    auths = dict(config.get("auths", {}))
+    for server in servers:
+        if server in auths:
+            # docker keeps an empty entry so 'docker login' state is listed
+            auths[server] = {}
+    config["auths"] = auths
+    return config
@@ -0,0 +1,123 @@
+"""
+keyctl
+
+minimal access to the Linux kernel key retention service
+
+Calls add_key(2) and keyctl(2) through libc's syscall() so no keyutils
+library or binary is needed.  Only 'user' type keys are used.  Failed
+calls raise OSError with the kernel's errno.
+"""
+
+import ctypes
+import errno
+import os
+import platform
+import sys
+
+# add_key and keyctl syscall numbers by machine
+SYSCALLS = {
+    "x86_64": (248, 250),
+    "aarch64": (217, 219),
+    "riscv64": (217, 219),
+    "i686": (286, 288),
+    "armv7l": (309, 311),
+    "ppc64le": (269, 271),
+    "s390x": (278, 280),
+}
+
+KEYRINGS = {"session": -3, "user": -4}
+
+KEYCTL_GET_KEYRING_ID = 0
+KEYCTL_SETPERM = 5
+KEYCTL_SEARCH = 10
+KEYCTL_READ = 11
+KEYCTL_SET_TIMEOUT = 15
+KEYCTL_INVALIDATE = 21
+
+# possessor: all; owning user: view, read, search, setattr
+USER_PERM = 0x3F2B0000
+
+# searching finds nothing usable
+NOT_FOUND = (errno.ENOKEY, errno.EKEYEXPIRED, errno.EKEYREVOKED)
+
+
+class KeyctlUnavailable(Exception):
+    pass
+
+
+def _arg(value):
+    return ctypes.c_long(value) if isinstance(value, int) else value
+
+
+class Keyring:
+    """a kernel keyring holding 'user' keys
+
+    keyring is 'session' (shared by the processes of a login or job) or
+    'user' (shared by all of the user's processes until logout)
+    """
+
+    def __init__(self, keyring="session"):
+        if sys.platform != "linux":
+            raise KeyctlUnavailable("kernel keyrings require Linux")
+        numbers = SYSCALLS.get(platform.machine())
+        if numbers is None:
+            raise KeyctlUnavailable(f"unsupported machine {platform.machine()}")
+        if keyring not in KEYRINGS:
+            raise KeyctlUnavailable(f"unknown keyring '{keyring}'")
+        self.add_key, self.keyctl_number = numbers
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.syscall = libc.syscall
+        self.syscall.restype = ctypes.c_long
+        self.name = keyring
+        # the session keyring is joined or created if the process has none
+        self.id = self._keyctl(KEYCTL_GET_KEYRING_ID, KEYRINGS[keyring], 1)
+
+    def _call(self, number, *args):
+        result = self.syscall(ctypes.c_long(number), *map(_arg, args))
+        if result < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return result
+
+    def _keyctl(self, operation, *args):
+        return self._call(self.keyctl_number, operation, *args)
+
+    def search(self, description):
+        """return the id of the key or None if absent or expired"""
+        try:
+            return self._keyctl(
+                KEYCTL_SEARCH, self.id, b"user", description.encode(), 0
+            )
+        except OSError as e:
+            if e.errno in NOT_FOUND:
+                return None
+            raise
+
+    def read(self, key_id):
+        size = 1024
+        while True:
+            buffer = ctypes.create_string_buffer(size)
+            length = self._keyctl(KEYCTL_READ, key_id, buffer, size)
+            if length <= size:
+                return buffer.raw[:length]
+            size = length
+
+    def add(self, description, payload, timeout=None):
+        """add or replace a key, expiring after timeout seconds"""
+        key_id = self._call(
+            self.add_key,
+            b"user",
+            description.encode(),
+            payload,
+            ctypes.c_size_t(len(payload)),
+            self.id,
+        )
+        if self.name == "user":
+            # readable from other sessions, which do not possess it
+            self._keyctl(KEYCTL_SETPERM, key_id, USER_PERM)
+        if timeout:
+            self._keyctl(KEYCTL_SET_TIMEOUT, key_id, int(timeout))
+        return key_id
+
+    def invalidate(self, key_id):
+        self._keyctl(KEYCTL_INVALIDATE, key_id)
@@ -0,0 +1,106 @@
+"""
+lock
+
+cross-process advisory lock serializing whole-service changes
+"""
+
+import fcntl
+import os
+import random
+import stat
+import tempfile
+import time
+from hashlib import sha256
+from pathlib import Path
+
+LOCK_TIMEOUT = 10
+LOCK_DELAY = 0.01
+LOCK_MAX_DELAY = 0.25
+
+
+class LockTimeout(Exception):
+    pass
+
+
+def lock_dir():
+    """return the directory for lock and limiter files
+
+    Without $XDG_RUNTIME_DIR, a directory in the shared temporary directory
+    is used, but only if it is ours and private; anyone could have created
+    it first.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "docker-credential-chamber"
+    path = (
+        Path(tempfile.gettempdir()) / f"docker-credential-chamber-{os.getuid()}"
+    )
+    try:
+        path.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or stat.S_IMODE(info.st_mode) != 0o700
+    ):
+        raise PermissionError(
+            f"refusing to use {path}: not a private directory of this user"
+        )
+    return path
+
+
+class ServiceLock:
+    """fcntl lock on a per-service file, waiting at most timeout seconds
+
+    After acquiring, waited holds the seconds spent waiting and contended
+    whether another holder had to be waited for.
+    """
+
+    def __init__(self, service, timeout=LOCK_TIMEOUT, path=None):
+        self.service = service
+        self.timeout = timeout
+        path = Path(path) if path else lock_dir()
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        name = sha256(service.encode()).hexdigest()[:16]
+        self.path = path / f"{name}.lock"
+        self.fd = None
+        self.waited = 0.0
+        self.contended = False
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        delay = LOCK_DELAY
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        while True:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                self.contended = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    os.close(self.fd)
+                    self.fd = None
+                    raise LockTimeout(
+                        f"timed out after {self.timeout} seconds waiting "
+                        f"for the lock on service '{self.service}'"
+                    )
+                time.sleep(min(remaining, random.uniform(delay / 2, delay)))
+                delay = min(delay * 2, LOCK_MAX_DELAY)
+        self.waited = time.monotonic() - start
+        return self
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
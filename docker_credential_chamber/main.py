@@ -0,0 +1,148 @@
+"""
+main
+
+console entry point
+
+Docker runs the helper as a fresh process for every protocol call.  The
+bare protocol verbs are dispatched here straight from sys.argv and the
+DOCKER_CREDENTIALS_* environment; click, logging and ExceptionHandler
+are only imported for everything else (options, --help, install, serve)
+or when debug output or a log file is requested.
+"""
+
+import json
+import os
+import sys
+
+PROTOCOL_COMMANDS = ["get", "store", "erase", "list"]
+
+TRUE = ("1", "true", "t", "yes", "y", "on")
+FALSE = ("0", "false", "f", "no", "n", "off", "")
+
+
+def _flag(value):
+    value = value.strip().lower()
+    if value in TRUE:
+        return True
+    if value in FALSE:
+        return False
+    raise ValueError(f"invalid flag value '{value}'")
+
+
+def _options(env):
+    """return DCC options from the environment as the cli group reads them
+
+    raises ValueError when a value needs click's validation and messages
+    """
+    from .backend import BACKENDS
+    from .cache import (
+        CACHE_SIZE,
+        CACHE_STORES,
+        CACHE_TTL,
+        MISS_TTL,
+        REFRESH_AFTER,
+    )
+    from .daemon import default_socket
+    from .dcc import READBACK_DELAY, READBACK_TIMEOUT, WORKERS
+    from .document import LAYOUTS
+    from .lock import LOCK_TIMEOUT
+    from .ratelimit import BURST, RATE, RETRIES
+    from .replica import HEDGE_DELAY
+
+    if _flag(env.get("DOCKER_CREDENTIALS_DEBUG", "")):
+        raise ValueError("debug requested")
+    if env.get("DOCKER_CREDENTIALS_LOGFILE"):
+        raise ValueError("logging requested")
+    backend = env.get("DOCKER_CREDENTIALS_BACKEND") or "chamber"
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend '{backend}'")
+    layout = env.get("DOCKER_CREDENTIALS_LAYOUT") or "keys"
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown layout '{layout}'")
+    cache_store = env.get("DOCKER_CREDENTIALS_CACHE_STORE") or "file"
+    if cache_store not in CACHE_STORES:
+        raise ValueError(f"unknown cache store '{cache_store}'")
+    options = dict(
+        service=env.get("DOCKER_CREDENTIALS_SERVICE") or "docker/credentials",
+        write_service=env.get("DOCKER_CREDENTIALS_WRITE_SERVICE") or None,
+        vault_token=env.get("DOCKER_CREDENTIALS_TOKEN") or None,
+        chamber=env.get("CHAMBER") or "chamber",
+        backend=backend,
+        layout=layout,
+        replicas=env.get("DOCKER_CREDENTIALS_REPLICAS", "").split(),
+        cache=_flag(env.get("DOCKER_CREDENTIALS_CACHE", "")),
+        cache_store=cache_store,
+        trace=env.get("DOCKER_CREDENTIALS_TRACE") or None,
+        single_flight=_flag(env.get("DOCKER_CREDENTIALS_SINGLE_FLIGHT", "")),
+    )
+    for name, convert, default in [
+        ("readback_timeout", float, READBACK_TIMEOUT),
+        ("readback_delay", float, READBACK_DELAY),
+        ("cache_ttl", int, CACHE_TTL),
+        ("cache_size", int, CACHE_SIZE),
+        ("refresh_after", int, REFRESH_AFTER),
+        ("miss_ttl", int, MISS_TTL),
+        ("lock_timeout", float, LOCK_TIMEOUT),
+        ("workers", int, WORKERS),
+        ("rate", float, RATE),
+        ("burst", int, BURST),
+        ("retries", int, RETRIES),
+        ("hedge_delay", float, HEDGE_DELAY),
+    ]:
+        value = env.get(f"DOCKER_CREDENTIALS_{name.upper()}")
+        options[name] = convert(value) if value else default
+    socket = env.get("DOCKER_CREDENTIALS_SOCKET") or default_socket()
+    return options, socket
+
+
+def _input(command, stdin):
+    if command == "list":
+        return None
+    data = stdin.read()
+    if command == "store":
+        return json.loads(data)
+    return data.strip()
+
+
+def protocol(command, options, socket, stdin=None, stdout=None):
+    """run a protocol command without click; returns the exit code"""
+    from .daemon import COMMANDS, DaemonUnavailable, request
+    from .dcc import DCC
+
+    data = _input(command, stdin or sys.stdin)
+    try:
+        response = request(socket, options["service"], command, data)
+    except DaemonUnavailable:
+        result = COMMANDS[command](DCC(**options), data)
+    else:
+        sys.stderr.write(response["stderr"])
+        if response["exit"]:
+            return response["exit"]
+        result = response["result"]
+    if command in ("get", "list"):
+        json.dump(result, stdout or sys.stdout)
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 1 and argv[0] in PROTOCOL_COMMANDS:
+        try:
+            options, socket = _options(os.environ)
+        except ValueError:
+            pass
+        else:
+            try:
+                return protocol(argv[0], options, socket)
+            except Exception as e:
+                from .exception_handler import exception_handler
+
+                exception_handler(type(e), e, e.__traceback__)
+
+    from .cli import cli
+
+    return cli(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+ratelimit
+
+host-wide token bucket shared by helper processes, and retry with
+backoff for calls the backend refused as throttled
+
+The bucket state lives in a small file under the lock directory, one per
+backend type, so every helper process on the host draws from the same
+budget.  Each caller takes a token immediately, letting the balance go
+negative, and sleeps until its token would have been refilled; callers
+are served in arrival order without polling.
+"""
+
+import fcntl
+import os
+import random
+import struct
+import time
+from pathlib import Path
+
+from .backend import throttled
+from .lock import lock_dir
+from .trace import BACKEND_METHODS, Tracer
+
+# storage calls per second; 0 disables the limiter
+RATE = 0
+# calls that may be made at once after an idle period
+BURST = 5
+# retries of a throttled call
+RETRIES = 3
+RETRY_DELAY = 0.1
+RETRY_MAX_DELAY = 2
+
+# tokens, last refill, calls, delayed calls, seconds delayed
+STATE = struct.Struct("<ddQQd")
+
+
+class RateLimiter:
+    """token bucket of rate calls per second shared through a file"""
+
+    def __init__(self, name, rate, burst=BURST, path=None):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        # a directory of its own: cache eviction prunes the lock directory
+        path = (Path(path) if path else lock_dir()) / "ratelimit"
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.path = path / name
+
+    def _update(self, func):
+        """apply func to the locked state, returning its result"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = os.pread(fd, STATE.size, 0)
+            if len(data) == STATE.size:
+                state = list(STATE.unpack(data))
+            else:
+                state = [self.burst, time.monotonic(), 0, 0, 0.0]
+            result = func(state)
+            os.pwrite(fd, STATE.pack(*state), 0)
+            return result
+        finally:
+            os.close(fd)
+
+    def _take(self, state):
+        now = time.monotonic()
+        tokens, updated = state[0], state[1]
+        elapsed = max(now - updated, 0)
+        tokens = min(self.burst, tokens + elapsed * self.rate) - 1
+        wait = -tokens / self.rate if tokens < 0 else 0.0
+        state[0], state[1] = tokens, now
+        state[2] += 1
+        if wait:
+            state[3] += 1
+            state[4] += wait
+        return wait
+
+    def acquire(self):
+        """wait for a token; return the seconds waited"""
+        wait = self._update(self._take)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        """return the shared counters"""
+        state = self._update(lambda state: list(state))
+        return dict(
+            rate=self.rate,
+            burst=self.burst,
+            calls=state[2],
+            delayed=state[3],
+            delayed_seconds=round(state[4], 3),
+        )
+
+
+class LimitedBackend:
+    """proxy taking a limiter token before each storage call and retrying
+    throttled calls with jittered exponential backoff
+    """
+
+    def __init__(self, backend, limiter=None, retries=RETRIES, tracer=None):
+        self.backend = backend
+        self.limiter = limiter
+        self.retries = retries
+        self.tracer = tracer or Tracer()
+
+    def __str__(self):
+        return str(self.backend)
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if name not in BACKEND_METHODS:
+            return attr
+
+        def _call(*args):
+            delay = RETRY_DELAY
+            for attempt in range(self.retries + 1):
+                self._wait()
+                try:
+                    return attr(*args)
+                except Exception as e:
+                    if attempt == self.retries or not throttled(e):
+                        raise
+                self.tracer.count("backend_retries")
+                time.sleep(random.uniform(0, delay))
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+        return _call
+
+    def _wait(self):
+        if self.limiter:
+            waited = self.limiter.acquire()
+            if waited:
+                self.tracer.count("throttle_waits")
+                self.tracer.count("throttled_ms", round(waited * 1000))
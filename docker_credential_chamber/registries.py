@@ -0,0 +1,57 @@
+"""
+registries
+
+find the registries a build will pull from in Dockerfiles, compose files
+and image references
+"""
+
+import re
+
+# the server docker passes to credential helpers for Docker Hub
+DOCKER_HUB = "https://index.docker.io/v1/"
+# hostnames docker resolves to Docker Hub
+DOCKER_HUB_HOSTS = {"docker.io", "index.docker.io", "registry-1.docker.io"}
+
+FROM = re.compile(
+    r"^\s*FROM\s+(?:--\S+\s+)*(?P<image>\S+)(?:\s+AS\s+(?P<stage>\S+))?",
+    re.IGNORECASE | re.MULTILINE,
+)
+COPY_FROM = re.compile(r"--from=(?P<image>\S+)", re.IGNORECASE)
+COMPOSE_IMAGE = re.compile(
+    r"^\s*image:\s*[\"']?(?P<image>[^\"'\s#]+)", re.MULTILINE
+)
+
+
+def image_registry(image):
+    """return the credential helper server for an image reference"""
+    first, sep, _ = image.partition("/")
+    if sep and ("." in first or ":" in first or first == "localhost"):
+        if first.lower() in DOCKER_HUB_HOSTS:
+            return DOCKER_HUB
+        return first
+    return DOCKER_HUB
+
+
+def file_images(text):
+    """return image references named in a Dockerfile or compose file"""
+    stages = set()
+    images = []
+    for match in FROM.finditer(text):
+        images.append(match["image"])
+        if match["stage"]:
+            stages.add(match["stage"].lower())
+    images.extend(m["image"] for m in COPY_FROM.finditer(text))
+    images.extend(m["image"] for m in COMPOSE_IMAGE.finditer(text))
+    return [
+        image
+        for image in images
+        if image.lower() not in stages
+        and image != "scratch"
+        and not image.isdigit()
+        and "$" not in image
+    ]
+
+
+def registries(images):
+    """return the distinct registries of images in first-seen order"""
+    return list(dict.fromkeys(image_registry(image) for image in images))
@@ -0,0 +1,166 @@
+"""
+replica
+
+a primary backend mirrored to replicas
+
+Reads are hedged: when the primary has not answered within hedge_delay
+seconds, or fails, the same read goes to the next replica and the first
+answer wins.  Writes and deletes go to the primary and all replicas at
+once; the primary must succeed, failed replicas are reported and left to
+be caught up by the next write.
+
+Since a replica may have missed writes, its answer that a key or service
+is empty only counts once the primary has failed, and keys this instance
+changed, such as those being read back after a write, are read from the
+primary alone.  Key versions are not comparable between backends and
+always come from the primary.
+
+A replica is given as NAME[,VAR=VALUE...]: a backend name or a chamber
+binary, followed by environment overrides such as AWS_REGION.
+"""
+
+import queue
+import sys
+import threading
+
+from .backend import BACKENDS, Backend, BackendError, open_backend
+from .trace import Tracer
+
+# seconds to wait for the primary before also asking a replica
+HEDGE_DELAY = 0.25
+
+
+def open_replica(spec, service, env, chamber="chamber"):
+    """return the backend described by a replica spec"""
+    name, *assignments = spec.split(",")
+    env = dict(env)
+    for assignment in assignments:
+        var, sep, value = assignment.partition("=")
+        if not (var and sep):
+            raise BackendError(f"invalid replica setting '{assignment}'")
+        env[var] = value
+    if name in BACKENDS:
+        return open_backend(name, service, env, chamber=chamber)
+    return open_backend("chamber", service, env, chamber=name)
+
+
+def _daemon(target, *args):
+    # a slow backend must not hold up the exit of the helper process
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+class ReplicatedBackend(Backend):
+    def __init__(self, primary, replicas, hedge_delay=HEDGE_DELAY, tracer=None):
+        super().__init__(primary.service)
+        self.primary = primary
+        self.replicas = replicas
+        self.hedge_delay = hedge_delay
+        self.tracer = tracer or Tracer()
+        self.spawns_per_call = primary.spawns_per_call
+        # keys changed through this instance, read back from the primary
+        self.changed = set()
+
+    def __str__(self):
+        return "+".join(map(str, [self.primary, *self.replicas]))
+
+    def version(self):
+        return self.primary.version()
+
+    def _answers(self, name, *args):
+        """yield (backend, value, error) for name(*args) as they arrive,
+        asking the next backend each time hedge_delay passes without one
+        """
+        answers = queue.Queue()
+
+        def _call(backend):
+            try:
+                answers.put((backend, getattr(backend, name)(*args), None))
+            except Exception as e:
+                answers.put((backend, None, e))
+
+        waiting = [self.primary, *self.replicas]
+        pending = 0
+        while waiting or pending:
+            if waiting:
+                _daemon(_call, waiting.pop(0))
+                pending += 1
+            try:
+                answer = answers.get(
+                    timeout=self.hedge_delay if waiting else None
+                )
+            except queue.Empty:
+                self.tracer.count("hedged")
+                continue
+            pending -= 1
+            yield answer
+
+    def _hedged(self, name, *args):
+        """return the first answer to name(*args) from any backend
+
+        An empty answer from a replica is held back while the primary may
+        still answer, and only returned once it has failed.
+        """
+        primary_failed = False
+        held = []
+        error = None
+        for backend, value, e in self._answers(name, *args):
+            if e is not None:
+                error = e
+                primary_failed |= backend is self.primary
+            elif value or backend is self.primary or primary_failed:
+                return value
+            else:
+                held.append(value)
+            if primary_failed and held:
+                return held[0]
+        if held:
+            return held[0]
+        raise error
+
+    def _mirrored(self, name, *args):
+        """run name(*args) on the primary and all replicas at once"""
+        errors = {}
+
+        def _call(backend):
+            try:
+                getattr(backend, name)(*args)
+            except Exception as e:
+                errors[backend] = e
+
+        threads = [_daemon(_call, replica) for replica in self.replicas]
+        _call(self.primary)
+        for thread in threads:
+            thread.join()
+        if self.primary in errors:
+            raise errors.pop(self.primary)
+        for backend, e in errors.items():
+            self.tracer.count("replica_errors")
+            sys.stderr.write(f"replica {backend} {name} failed: {e}\n")
+
+    def read_key(self, key):
+        if key in self.changed:
+            return self.primary.read_key(key)
+        return self._hedged("read_key", key)
+
+    def export(self):
+        if self.changed:
+            return self.primary.export()
+        return self._hedged("export")
+
+    def exists(self):
+        if self.changed:
+            return self.primary.exists()
+        return self._hedged("exists")
+
+    def versions(self):
+        return self.primary.versions()
+
+    def write_key(self, key, value):
+        self.changed.add(key)
+        self._mirrored("write_key", key, value)
+
+    def delete_key(self, key):
+        self.changed.add(key)
+        self._mirrored("delete_key", key)
@@ -0,0 +1,91 @@
+"""
+singleflight
+
+coalesce concurrent lookups of one key across helper processes
+
+Docker starts a helper process per image it resolves, so a parallel
+build asks for the same registry many times at once.  The first process
+takes a per-key lock and runs the lookup; the others wait on the lock and
+then take its result from the caller's own caches instead of repeating
+the backend call.
+
+Where the caller keeps its cache in a kernel keyring, a result is also
+handed to waiting processes through a short-lived entry in that keyring,
+which covers lookups the caches do not keep.  Waiters announce themselves
+with a marker file beside the lock, and the handoff is only written when
+one did, so an uncontended lookup stores nothing.
+"""
+
+from .cache import CacheUnavailable, KeyringCache
+from .lock import LOCK_TIMEOUT, LockTimeout, ServiceLock
+
+# seconds a handed off result remains readable by waiting processes
+HANDOFF_TTL = 5
+
+
+class SingleFlight:
+    def __init__(
+        self, service, env, timeout=LOCK_TIMEOUT, path=None, keyring=None
+    ):
+        self.service = service
+        self.env = env
+        self.timeout = timeout
+        self.path = path
+        self.keyring = keyring
+        self._handoff = None if keyring else False
+
+    @property
+    def handoff(self):
+        """keyring entries passing results to waiters, or False"""
+        if self._handoff is None:
+            try:
+                self._handoff = KeyringCache(
+                    self.service,
+                    self.env,
+                    ttl=HANDOFF_TTL,
+                    keyring=self.keyring,
+                    prefix="docker-credential-chamber-flight",
+                )
+            except CacheUnavailable:
+                self._handoff = False
+        return self._handoff
+
+    def run(self, key, fetch, cached=None):
+        """return fetch() or the result a concurrent caller just fetched
+
+        cached, if given, is checked for the result after waiting; it is
+        all waiters have when there is no keyring handoff.
+        Returns (result, shared).
+        """
+        lock = ServiceLock(f"{self.service}\0{key}", 0, self.path)
+        waiting = lock.path.with_suffix(".waiting")
+        try:
+            lock.acquire()
+            # left by a waiter that arrived after the last handoff
+            waiting.unlink(missing_ok=True)
+        except LockTimeout:
+            waiting.touch(mode=0o600)
+            lock.timeout = self.timeout
+            try:
+                lock.acquire()
+            except LockTimeout:
+                # the first caller is stuck; do not queue behind it
+                return fetch(), False
+        try:
+            if lock.contended:
+                ret = self.handoff.get(key) if self.handoff else None
+                if ret is None and cached:
+                    ret = cached()
+                if ret is not None:
+                    return ret, True
+            ret = fetch()
+            if self.handoff and waiting.exists():
+                self.handoff.put(key, ret)
+                waiting.unlink(missing_ok=True)
+            return ret, False
+        finally:
+            lock.release()
+
+    def invalidate(self, *keys):
+        if self.handoff:
+            self.handoff.invalidate(*keys)
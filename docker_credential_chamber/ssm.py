@@ -0,0 +1,185 @@
+"""
+ssm
+
+native AWS SSM Parameter Store backend
+
+Keys are stored as chamber does: SecureString parameters named
+/<service>/<key>, encrypted with the CHAMBER_KMS_KEY_ALIAS key.
+AWS credentials and region are taken from the environment.
+"""
+
+import hashlib
+import hmac
+import json
+from datetime import datetime, timezone
+
+from .backend import Backend, BackendError
+from .httppool import ConnectionPool
+
+DEFAULT_KMS_KEY_ALIAS = "alias/parameter_store_key"
+PAGE_SIZE = 10
+DESCRIBE_PAGE_SIZE = 50
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def sign(headers, body, host, region, access_key, secret_key, now=None):
+    """return the SigV4 Authorization header for a POST to / on host"""
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    headers["X-Amz-Date"] = amz_date
+    signed = {k.lower(): v.strip() for k, v in headers.items()}
+    signed["host"] = host
+    names = sorted(signed)
+    canonical = "\n".join(
+        [
+            "POST",
+            "/",
+            "",
+            "".join(f"{k}:{signed[k]}\n" for k in names),
+            ";".join(names),
+            hashlib.sha256(body).hexdigest(),
+        ]
+    )
+    scope = f"{date}/{region}/ssm/aws4_request"
+    to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical.encode()).hexdigest(),
+        ]
+    )
+    key = ("AWS4" + secret_key).encode()
+    for part in (date, region, "ssm", "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+    return (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={';'.join(names)}, Signature={signature}"
+    )
+
+
+class SSMBackend(Backend):
+    def __init__(self, service, env):
+        super().__init__(service.strip("/").lower())
+        self.access_key = env.get("AWS_ACCESS_KEY_ID")
+        self.secret_key = env.get("AWS_SECRET_ACCESS_KEY")
+        if not (self.access_key and self.secret_key):
+            raise BackendError(
+                "ssm backend requires AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY"
+            )
+        self.session_token = env.get("AWS_SESSION_TOKEN")
+        self.region = env.get("AWS_REGION") or env.get("AWS_DEFAULT_REGION")
+        if not self.region:
+            raise BackendError("ssm backend requires AWS_REGION")
+        self.kms_key = env.get("CHAMBER_KMS_KEY_ALIAS", DEFAULT_KMS_KEY_ALIAS)
+        endpoint = (
+            env.get("AWS_ENDPOINT_URL_SSM")
+            or env.get("AWS_ENDPOINT_URL")
+            or f"https://ssm.{self.region}.amazonaws.com"
+        )
+        self.pool = ConnectionPool(endpoint)
+
+    def version(self):
+        return f"ssm {self.pool.netloc} /{self.service}"
+
+    def _name(self, key):
+        return f"/{self.service}/{key}"
+
+    def _call(self, action, params):
+        """return (error_type, response) for an SSM API action"""
+        body = json.dumps(params).encode()
+        headers = {
+            "Content-Type": "application/x-amz-json-1.1",
+            "X-Amz-Target": f"AmazonSSM.{action}",
+        }
+        if self.session_token:
+            headers["X-Amz-Security-Token"] = self.session_token
+        headers["Authorization"] = sign(
+            headers,
+            body,
+            self.pool.netloc,
+            self.region,
+            self.access_key,
+            self.secret_key,
+        )
+        status, data = self.pool.request("POST", "/", body, headers)
+        response = json.loads(data) if data else {}
+        if status < 300:
+            return None, response
+        error = response.get("__type", "").rsplit("#", 1)[-1]
+        if error == "ParameterNotFound":
+            return error, response
+        message = response.get("message") or response.get("Message", "")
+        raise BackendError(f"ssm {action} failed: {status} {error} {message}")
+
+    def _pages(self, action, params):
+        """yield the parameters listed by action, fetching pages as needed"""
+        while True:
+            _, response = self._call(action, params)
+            yield from response.get("Parameters", [])
+            if not response.get("NextToken"):
+                return
+            params["NextToken"] = response["NextToken"]
+
+    def _parameters(self):
+        """yield the service's parameters"""
+        params = {
+            "Path": f"/{self.service}",
+            "WithDecryption": True,
+            "MaxResults": PAGE_SIZE,
+        }
+        return self._pages("GetParametersByPath", params)
+
+    def read_key(self, key):
+        params = {"Name": self._name(key), "WithDecryption": True}
+        error, response = self._call("GetParameter", params)
+        if error:
+            return None
+        return response["Parameter"]["Value"]
+
+    def write_key(self, key, value):
+        self._call(
+            "PutParameter",
+            {
+                "Name": self._name(key),
+                "Value": value,
+                "Type": "SecureString",
+                "KeyId": self.kms_key,
+                "Overwrite": True,
+            },
+        )
+
+    def delete_key(self, key):
+        error, _ = self._call("DeleteParameter", {"Name": self._name(key)})
+        if error:
+            raise BackendError(f"ssm parameter {self._name(key)} not found")
+
+    def export(self):
+        return {
+            p["Name"].rsplit("/", 1)[-1]: p["Value"] for p in self._parameters()
+        }
+
+    def exists(self):
+        return next(self._parameters(), None) is not None
+
+    def versions(self):
+        # parameter metadata only: no values are decrypted
+        params = {
+            "ParameterFilters": [
+                {
+                    "Key": "Path",
+                    "Option": "OneLevel",
+                    "Values": [f"/{self.service}"],
+                }
+            ],
+            "MaxResults": DESCRIBE_PAGE_SIZE,
+        }
+        return {
+            p["Name"].rsplit("/", 1)[-1]: p["Version"]
+            for p in self._pages("DescribeParameters", params)
+        }
@@ -0,0 +1,117 @@
+"""
+trace
+
+timing spans and counters written as JSON lines
+
+Each finished span emits one record with its duration in milliseconds
+and the counters (backend calls, chamber spawns, readback retries)
+incremented while it was open, so a protocol command's record totals
+everything it caused.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+BACKEND_METHODS = [
+    "read_key",
+    "write_key",
+    "delete_key",
+    "write_keys",
+    "export",
+    "exists",
+    "versions",
+]
+
+
+class Tracer:
+    """emit span records to a file path and/or a logger
+
+    Without either, spans only maintain the counters.
+    """
+
+    def __init__(self, path=None, logger=None):
+        self.path = path
+        self.logger = logger
+        self.enabled = bool(path or logger)
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.fd = None
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def span(self, name, **fields):
+        """time the enclosed block; fields may be added to while open"""
+        if not self.enabled:
+            yield fields
+            return
+        with self.lock:
+            before = self.counters.copy()
+        start = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = e.__class__.__name__
+            raise
+        finally:
+            fields["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            with self.lock:
+                fields.update(self.counters - before)
+            self.emit(name, fields)
+
+    def emit(self, name, fields):
+        record = {"ts": round(time.time(), 6), "pid": os.getpid(), "span": name}
+        record.update(fields)
+        line = json.dumps(record, default=str)
+        if self.logger:
+            self.logger.info(line)
+        if self.path:
+            with self.lock:
+                if self.fd is None:
+                    self.fd = os.open(
+                        self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600
+                    )
+                # one write per record keeps lines whole between processes
+                os.write(self.fd, (line + "\n").encode())
+
+
+def traced(method):
+    """decorator timing a DCC method as a span named after it"""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.tracer.span(f"dcc.{method.__name__}"):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class TracedBackend:
+    """proxy timing each storage call of a backend"""
+
+    def __init__(self, backend, tracer):
+        self.backend = backend
+        self.tracer = tracer
+
+    def __str__(self):
+        return str(self.backend)
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if name not in BACKEND_METHODS:
+            return attr
+
+        def _call(*args):
+            with self.tracer.span(f"backend.{name}", backend=str(self.backend)):
+                self.tracer.count("calls")
+                self.tracer.count("spawns", self.backend.spawns_per_call)
+                return attr(*args)
+
+        return _call
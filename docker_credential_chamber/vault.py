@@ -0,0 +1,93 @@
+"""
+vault
+
+native Vault KV version 2 backend
+
+A service is one KV secret at <mount>/<service> with a field for each
+encoded server key, as stored by the vault dialect of chamber.
+"""
+
+import json
+import ssl
+from urllib.parse import quote
+
+from .backend import Backend, BackendError
+from .httppool import ConnectionPool
+
+DEFAULT_ADDR = "https://127.0.0.1:8200"
+DEFAULT_MOUNT = "secret"
+
+
+class VaultBackend(Backend):
+    def __init__(self, service, env):
+        super().__init__(service)
+        self.token = env.get("VAULT_TOKEN")
+        if not self.token:
+            raise BackendError("vault backend requires VAULT_TOKEN")
+        self.addr = env.get("VAULT_ADDR", DEFAULT_ADDR)
+        self.namespace = env.get("VAULT_NAMESPACE")
+        mount = env.get("DOCKER_CREDENTIALS_VAULT_MOUNT", DEFAULT_MOUNT)
+        self.path = f"/v1/{mount.strip('/')}/data/{quote(service.strip('/'))}"
+        context = ssl.create_default_context(cafile=env.get("VAULT_CACERT"))
+        if env.get("VAULT_SKIP_VERIFY", "").lower() in ("1", "true"):
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        self.pool = ConnectionPool(self.addr, ssl_context=context)
+
+    def version(self):
+        return f"vault {self.addr}{self.path}"
+
+    def _request(self, method, body=None, content_type="application/json"):
+        headers = {"X-Vault-Token": self.token, "Content-Type": content_type}
+        if self.namespace:
+            headers["X-Vault-Namespace"] = self.namespace
+        if body is not None:
+            body = json.dumps(body).encode()
+        status, data = self.pool.request(method, self.path, body, headers)
+        response = json.loads(data) if data else {}
+        if status >= 300 and status != 404:
+            errors = "; ".join(response.get("errors", []))
+            raise BackendError(
+                f"vault {method} {self.path} failed: {status} {errors}"
+            )
+        return status, response
+
+    def _data(self):
+        status, response = self._request("GET")
+        if status == 404:
+            return {}
+        return (response.get("data") or {}).get("data") or {}
+
+    def _patch(self, data):
+        status, _ = self._request(
+            "PATCH", {"data": data}, "application/merge-patch+json"
+        )
+        if status != 404:
+            return
+        # the secret does not exist yet; create it unless another writer
+        # has done so since the patch, in which case patch again
+        create = {k: v for k, v in data.items() if v is not None}
+        if not create:
+            return
+        try:
+            self._request("POST", {"options": {"cas": 0}, "data": create})
+        except BackendError:
+            self._request(
+                "PATCH", {"data": data}, "application/merge-patch+json"
+            )
+
+    def read_key(self, key):
+        return self._data().get(key)
+
+    def write_key(self, key, value):
+        self._patch({key: value})
+
+    def delete_key(self, key):
+        # a null field in a merge patch removes it
+        self._patch({key: None})
+
+    def export(self):
+        return self._data()
+
+    def exists(self):
+        return bool(self._data())
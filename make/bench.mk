@@ -0,0 +1,13 @@
+# protocol benchmarks against a fake chamber binary
+
+bench_opts ?=
+
+### benchmark protocol commands, writing JSON to bench_output.txt
+bench:
+	PYTHONPATH=. python benchmarks/bench.py $(bench_opts) --output bench_output.txt
+
+bench-clean:
+	rm -f bench_output.txt
+
+bench-sterile: bench-clean
+	@:
@@ -0,0 +1,53 @@
+# storage backend test cases using the in-memory backend
+
+import pytest
+
+from docker_credential_chamber.backend import (
+    BackendError,
+    MemoryBackend,
+    open_backend,
+)
+from docker_credential_chamber.dcc import DCC, encode_server
+
+CREDS = {"Username": "user", "Secret": "secret"}
+
+
+@pytest.fixture
+def memory():
+    return MemoryBackend("test/service")
+
+
+def test_memory_backend_keys(memory):
+    assert not memory.exists()
+    assert memory.export() == {}
+    memory.write_key("k", "v")
+    assert memory.exists()
+    assert memory.read_key("k") == "v"
+    assert memory.export() == {"k": "v"}
+    memory.delete_key("k")
+    assert memory.services == {}
+    assert memory.read_key("k") is None
+    with pytest.raises(BackendError):
+        memory.delete_key("k")
+
+
+def test_memory_backend_file(tmp_path):
+    path = tmp_path / "store.json"
+    env = {"DOCKER_CREDENTIALS_MEMORY_FILE": str(path)}
+    open_backend("memory", "test/service", env).write_key("k", "v")
+    assert path.is_file()
+    assert open_backend("memory", "test/service", env).read_key("k") == "v"
+    assert open_backend("memory", "other/service", env).export() == {}
+
+
+def test_dcc_memory_backend(memory):
+    dcc = DCC("test/service", backend=memory)
+    dcc.put("registry.example.org", "user", "secret")
+    assert dcc.get("registry.example.org") == CREDS
+    assert dcc.list() == {"registry.example.org": "user"}
+    key = encode_server("registry.example.org")
+    assert list(memory.export()) == [key]
+    dcc.delete("registry.example.org")
+    assert dcc.list() == {}
+    assert memory.calls["write_key"] == 1
+    assert memory.calls["delete_key"] == 1
@@ -0,0 +1,41 @@
+# benchmark harness smoke test
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_bench_report(tmp_path):
+    output = tmp_path / "bench.json"
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    subprocess.check_call(
+        [
+            sys.executable,
+            str(ROOT / "benchmarks" / "bench.py"),
+            "--sizes",
+            "1,10",
+            "--iterations",
+            "2",
+            "--output",
+            str(output),
+        ],
+        env=env,
+    )
+    report = json.loads(output.read_text())
+    results = {(r["command"], r["registries"]): r for r in report["results"]}
+    assert set(results) == {
+        (command, size)
+        for command in ["get", "list", "store", "erase"]
+        for size in [1, 10]
+    }
+    assert results[("get", 10)]["spawns"] == 1
+    assert results[("store", 10)]["spawns"] > 1
+    assert (
+        results[("list", 10)]["bytes_out"] > results[("list", 1)]["bytes_out"]
+    )
+    for result in report["results"]:
+        assert 0 < result["p50_ms"] <= result["p99_ms"]
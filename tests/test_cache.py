@@ -0,0 +1,156 @@
+# credential cache test cases
+
+import os
+import time
+import uuid
+
+import pytest
+
+from docker_credential_chamber.backend import BackendError, MemoryBackend
+from docker_credential_chamber.cache import (
+    KEY_SECRETS,
+    CacheUnavailable,
+    CredentialCache,
+    KeyringCache,
+    MissCache,
+)
+from docker_credential_chamber.dcc import DCC, encode_server
+
+ENV = {"VAULT_TOKEN": "test-token"}
+CREDS = {"Username": "user", "Secret": "secret"}
+
+
+@pytest.fixture
+def runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_cache_roundtrip(runtime_dir):
+    pytest.importorskip("cryptography")
+    cache = CredentialCache("test/service", ENV)
+    assert cache.get("key") is None
+    cache.put("key", CREDS)
+    assert cache.get("key") == CREDS
+    for path in cache.path.iterdir():
+        assert b"secret" not in path.read_bytes()
+    cache.invalidate("key")
+    assert cache.get("key") is None
+
+
+def test_cache_key_depends_on_token(runtime_dir):
+    pytest.importorskip("cryptography")
+    CredentialCache("test/service", ENV).put("key", CREDS)
+    other = CredentialCache("test/service", {"VAULT_TOKEN": "other"})
+    assert other.get("key") is None
+
+
+def test_cache_lru_eviction(runtime_dir):
+    pytest.importorskip("cryptography")
+    cache = CredentialCache("test/service", ENV, size=2)
+    cache.put("a", CREDS)
+    cache.put("b", CREDS)
+    cache.get("a")
+    cache.put("c", CREDS)
+    assert cache.get("b") is None
+    assert cache.get("a") == CREDS
+    assert cache.get("c") == CREDS
+
+
+def test_cache_requires_credentials(runtime_dir):
+    with pytest.raises(CacheUnavailable):
+        CredentialCache("test/service", {})
+
+
+def test_dcc_reports_unusable_cache(runtime_dir, monkeypatch, capsys):
+    for name in KEY_SECRETS:
+        monkeypatch.delenv(name, raising=False)
+    dcc = DCC("test/service", backend=MemoryBackend("test/service"), cache=True)
+    assert dcc.cache is None
+    assert "--cache disabled" in capsys.readouterr().err
+
+
+def test_miss_cache_expiry(runtime_dir):
+    misses = MissCache("test/service", ttl=10)
+    assert misses.get("key") is None
+    misses.put("key", True)
+    assert misses.get("key")
+    assert MissCache("other/service", ttl=10).get("key") is None
+    stale = misses._file("key").stat().st_mtime - 11
+    os.utime(misses._file("key"), (stale, stale))
+    assert misses.get("key") is None
+
+
+def test_dcc_remembers_misses(runtime_dir):
+    memory = MemoryBackend("test/service")
+    dcc = DCC("test/service", backend=memory, miss_ttl=10)
+    assert dcc.get("public.example.org") == {}
+    assert dcc.get("public.example.org") == {}
+    assert memory.calls["read_key"] == 1
+    assert memory.calls["export"] == 1
+    dcc.put("public.example.org", "user", "secret")
+    assert dcc.get("public.example.org") == CREDS
+
+
+def test_dcc_backend_error_is_not_a_miss(runtime_dir):
+    class Failing(MemoryBackend):
+        def read_key(self, key):
+            raise BackendError("denied")
+
+    failing = Failing("test/service")
+    dcc = DCC("test/service", backend=failing, miss_ttl=10)
+    with pytest.raises(BackendError):
+        dcc.get("private.example.org")
+    assert dcc.misses.get(encode_server("private.example.org")) is None
+
+
+@pytest.fixture
+def keyring_service():
+    """a service name of its own, its keyring entries removed afterwards"""
+    service = f"test/{uuid.uuid4().hex}"
+    try:
+        cache = KeyringCache(service, ENV)
+    except CacheUnavailable as e:
+        pytest.skip(str(e))
+    yield service
+    cache.invalidate("key", "*", "a.example.org")
+
+
+def test_keyring_roundtrip(keyring_service):
+    cache = KeyringCache(keyring_service, ENV)
+    assert cache.get("key") is None
+    cache.put("key", CREDS)
+    assert KeyringCache(keyring_service, ENV).get("key") == CREDS
+    assert KeyringCache(keyring_service, {}).get("key") is None
+    cache.invalidate("key")
+    assert cache.get("key") is None
+
+
+def test_keyring_expiry(keyring_service):
+    cache = KeyringCache(keyring_service, ENV, ttl=1)
+    cache.put("key", CREDS)
+    assert cache.get("key") == CREDS
+    time.sleep(1.2)
+    assert cache.get("key") is None
+
+
+def test_dcc_keyring_cache(keyring_service, monkeypatch):
+    for k, v in ENV.items():
+        monkeypatch.setenv(k, v)
+    memory = MemoryBackend(keyring_service)
+    dcc = DCC(
+        keyring_service,
+        backend=memory,
+        cache=True,
+        cache_store="session-keyring",
+    )
+    assert isinstance(dcc.cache, KeyringCache)
+    dcc.put("a.example.org", "user", "secret")
+    assert dcc.get("a.example.org") == CREDS
+    reads = memory.calls["read_key"]
+    assert dcc.get("a.example.org") == CREDS
+    assert memory.calls["read_key"] == reads
+    dcc.put("a.example.org", "user", "changed")
+    assert dcc.get("a.example.org")["Secret"] == "changed"
+    dcc.delete("a.example.org")
+    assert dcc.cache.get("a.example.org") is None
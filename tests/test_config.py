@@ -0,0 +1,74 @@
+# docker config.json update test cases
+
+import json
+
+import pytest
+
+from docker_credential_chamber.backend import MemoryBackend
+from docker_credential_chamber.config import load_config, save_config
+from docker_credential_chamber.dcc import DCC
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def dcc(home):
+    dcc = DCC("test/service", backend=MemoryBackend("test/service"))
+    dcc.put("a.example.org", "user", "secret")
+    return dcc
+
+
+def test_save_config_atomic(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("{}")
+    path.chmod(0o640)
+    save_config(path, {"credsStore": "chamber"})
+    assert load_config(path) == {"credsStore": "chamber"}
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ["config.json"]
+
+
+def test_save_config_keeps_symlink(tmp_path):
+    target = tmp_path / "dotfiles" / "config.json"
+    target.parent.mkdir()
+    target.write_text("{}")
+    path = tmp_path / "config.json"
+    path.symlink_to(target)
+    save_config(path, {"credsStore": "chamber"})
+    assert path.is_symlink()
+    assert load_config(target) == {"credsStore": "chamber"}
+    assert [p.name for p in target.parent.iterdir()] == ["config.json"]
+
+
+def test_install_default(dcc):
+    dcc.install()
+    assert load_config(dcc.config_file()) == {"credsStore": "chamber"}
+
+
+def test_install_per_registry(dcc):
+    path = dcc.config_file()
+    save_config(
+        path,
+        {"credsStore": "chamber", "credHelpers": {"gcr.io": "gcloud"}},
+    )
+    dcc.install(per_registry=True, creds_store=False)
+    assert load_config(path) == {
+        "credHelpers": {"gcr.io": "gcloud", "a.example.org": "chamber"}
+    }
+    dcc.put("b.example.org", "user", "secret")
+    dcc.delete("a.example.org")
+    config = json.loads(path.read_text())
+    assert config["credHelpers"] == {
+        "gcr.io": "gcloud",
+        "b.example.org": "chamber",
+    }
+
+
+def test_store_without_per_registry_leaves_config(dcc):
+    dcc.install()
+    dcc.put("b.example.org", "user", "secret")
+    assert load_config(dcc.config_file()) == {"credsStore": "chamber"}
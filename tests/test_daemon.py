@@ -0,0 +1,58 @@
+# daemon test cases
+
+import socket
+import threading
+
+import pytest
+
+from docker_credential_chamber.dcc import DCC
+from docker_credential_chamber.daemon import DaemonUnavailable, Server, request
+
+CREDS = {"Username": "user", "Secret": "secret"}
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(DCC, "get", lambda self, server: CREDS)
+    monkeypatch.setattr(DCC, "list", lambda self: {"r.example.org": "user"})
+    path = str(tmp_path / "daemon.sock")
+    server = Server(path, DCC("test/service"))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield path
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_daemon_get(daemon):
+    response = request(daemon, "test/service", "get", "r.example.org")
+    assert response["result"] == CREDS
+    assert response["exit"] == 0
+
+
+def test_daemon_list(daemon):
+    response = request(daemon, "test/service", "list", None)
+    assert response["result"] == {"r.example.org": "user"}
+
+
+def test_daemon_service_mismatch(daemon):
+    with pytest.raises(DaemonUnavailable):
+        request(daemon, "other/service", "get", "r.example.org")
+
+
+def test_daemon_not_running(tmp_path):
+    with pytest.raises(DaemonUnavailable):
+        request(str(tmp_path / "missing.sock"), "test/service", "list", None)
+
+
+def test_daemon_hung(tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(path)
+        listener.listen()
+        # accepted by the kernel, never answered
+        with pytest.raises(DaemonUnavailable):
+            request(path, "test/service", "list", None, timeout=0.1)
@@ -0,0 +1,249 @@
+# DCC unit tests
+
+import json
+import time
+from subprocess import CalledProcessError
+
+import pytest
+
+from docker_credential_chamber import backend
+from docker_credential_chamber import dcc as dcc_module
+from docker_credential_chamber.dcc import (
+    DCC,
+    ChangeError,
+    Exported,
+    encode_server,
+)
+
+CREDS_JSON = json.dumps({"Username": "user", "Secret": "secret"})
+
+
+@pytest.fixture
+def dcc(monkeypatch):
+    """DCC with chamber calls recorded instead of executed"""
+    calls = []
+    store = {
+        f"registry{i}.example.org": {"Username": f"user{i}", "Secret": "pw"}
+        for i in range(200)
+    }
+    monkeypatch.setattr(
+        backend, "check_output", lambda cmd, **_: calls.append(cmd) or b""
+    )
+    monkeypatch.setattr(
+        DCC, "_read_key", lambda self, server: store.get(server)
+    )
+    monkeypatch.setattr(DCC, "verify", lambda self, secrets: True)
+    dcc = DCC("test/service")
+    dcc.calls = calls
+    return dcc
+
+
+def test_put_writes_one_key(dcc):
+    dcc.put("new.example.org", "user", "secret")
+    assert len(dcc.calls) == 1
+    assert dcc.calls[0][1] == "write"
+    assert dcc.calls[0][4] == encode_server("new.example.org")
+
+
+def test_put_unchanged_writes_nothing(dcc):
+    dcc.put("registry7.example.org", "user7", "pw")
+    assert dcc.calls == []
+
+
+def test_delete_one_key(dcc):
+    dcc.delete("registry7.example.org")
+    assert len(dcc.calls) == 1
+    assert dcc.calls[0][1] == "delete"
+    assert dcc.calls[0][4] == encode_server("registry7.example.org")
+
+
+def test_verify_checks_only_changed_keys(monkeypatch):
+    reads = []
+    stale = {"count": 2}
+    creds = {"Username": "user", "Secret": "secret"}
+
+    def _read_key(self, server):
+        reads.append(server)
+        if stale["count"]:
+            stale["count"] -= 1
+            return None
+        return creds
+
+    sleeps = []
+    monkeypatch.setattr(DCC, "_read_key", _read_key)
+    monkeypatch.setattr(dcc_module.time, "sleep", sleeps.append)
+    dcc = DCC("test/service", readback_delay=0.01)
+    attempts, elapsed = dcc.verify({"new.example.org": creds})
+    assert attempts == 3
+    assert reads == ["new.example.org"] * 3
+    assert len(sleeps) == 2
+    assert 0.005 <= sleeps[0] <= 0.01
+    assert 0.01 <= sleeps[1] <= 0.02
+
+
+def test_verify_timeout(monkeypatch):
+    monkeypatch.setattr(DCC, "_read_key", lambda self, server: None)
+    dcc = DCC("test/service", readback_timeout=0.05, readback_delay=0.01)
+    with pytest.raises(SystemExit):
+        dcc.verify({"new.example.org": {"Username": "u", "Secret": "s"}})
+
+
+def test_get_reads_single_key(monkeypatch):
+    calls = []
+    creds = {"Username": "user", "Secret": "secret"}
+
+    def _check_output(cmd, **_):
+        calls.append(cmd[1])
+        return json.dumps(creds).encode()
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    assert DCC("test/service").get("registry.example.org") == creds
+    assert calls == ["read"]
+
+
+def test_get_missing_key_falls_back_to_export(monkeypatch):
+    calls = []
+
+    def _check_output(cmd, **_):
+        calls.append(cmd[1])
+        if cmd[1] == "read":
+            raise CalledProcessError(
+                1, cmd, stderr=b"Error: Failed to read: secret not found"
+            )
+        return b"{}"
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    assert DCC("test/service").get("registry.example.org") == {}
+    assert calls == ["read", "export"]
+
+
+def test_chamber_read_failure_raises(monkeypatch, capsys):
+    def _check_output(cmd, **_):
+        raise CalledProcessError(1, cmd, stderr=b"Error: i/o timeout")
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    with pytest.raises(CalledProcessError):
+        backend.ChamberBackend("test/service").read_key("key")
+    assert "i/o timeout" in capsys.readouterr().err
+
+
+def test_chamber_failure_is_not_empty_service(monkeypatch):
+    def _check_output(cmd, **_):
+        raise CalledProcessError(1, cmd, stderr=b"Error: token expired")
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    chamber = backend.ChamberBackend("test/service")
+    with pytest.raises(CalledProcessError):
+        chamber.export()
+    with pytest.raises(CalledProcessError):
+        DCC("test/service").get("registry.example.org")
+
+
+def test_chamber_missing_service_is_empty(monkeypatch):
+    def _check_output(cmd, **_):
+        raise CalledProcessError(1, cmd, stderr=b"Error: service not found")
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    assert backend.ChamberBackend("test/service").export() == {}
+
+
+class SlowBackend(backend.MemoryBackend):
+    """memory backend taking DELAY seconds per write, failing 'bad' keys"""
+
+    DELAY = 0.05
+
+    def write_key(self, key, value):
+        time.sleep(self.DELAY)
+        if key == encode_server("bad.example.org"):
+            raise backend.BackendError("write refused")
+        super().write_key(key, value)
+
+
+def test_apply_fans_out():
+    memory = SlowBackend("test/service")
+    dcc = DCC("test/service", backend=memory, workers=8)
+    changes = {
+        f"r{i}.example.org": {"Username": "u", "Secret": "s"} for i in range(8)
+    }
+    start = time.monotonic()
+    dcc.apply(changes)
+    assert time.monotonic() - start < SlowBackend.DELAY * 4
+    assert memory.calls["write_key"] == 8
+
+
+def test_apply_collects_errors():
+    memory = SlowBackend("test/service")
+    dcc = DCC("test/service", backend=memory, workers=4)
+    changes = {
+        server: {"Username": "u", "Secret": "s"}
+        for server in ["a.example.org", "bad.example.org", "b.example.org"]
+    }
+    with pytest.raises(ChangeError) as e:
+        dcc.apply(changes)
+    assert list(e.value.errors) == ["bad.example.org"]
+    assert sorted(dcc.list()) == ["a.example.org", "b.example.org"]
+
+
+def test_read_skips_list_services(monkeypatch):
+    calls = []
+
+    def _check_output(cmd, **_):
+        calls.append(cmd[1])
+        return json.dumps({encode_server("r.example.org"): CREDS_JSON}).encode()
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    assert DCC("test/service").list() == {"r.example.org": "user"}
+    assert calls == ["export"]
+
+
+def test_chamber_exists_memoized(monkeypatch):
+    calls = []
+
+    def _check_output(cmd, **_):
+        calls.append(cmd[1])
+        return b"{}"
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    chamber = backend.ChamberBackend("test/service")
+    assert not chamber.exists()
+    assert not chamber.exists()
+    assert calls == ["export"]
+    chamber.write_key("key", "value")
+    assert chamber.exists()
+    assert calls == ["export", "write"]
+
+
+def test_exported_parses_only_requested():
+    data = {encode_server(f"r{i}.example.org"): "not json" for i in range(1000)}
+    data[encode_server("target.example.org")] = CREDS_JSON
+    exported = Exported(data)
+    assert exported.get("target.example.org") == json.loads(CREDS_JSON)
+    assert exported.get("missing.example.org") is None
+    assert "r7.example.org" in exported
+    assert len(exported) == 1001
+    assert sorted(exported)[0] == "r0.example.org"
+
+
+def test_exported_usernames():
+    exported = Exported({encode_server("r.example.org"): CREDS_JSON})
+    assert exported.usernames() == {"r.example.org": "user"}
+    assert dict(exported) == {"r.example.org": json.loads(CREDS_JSON)}
+
+
+@pytest.mark.parametrize(
+    "call",
+    [
+        lambda dcc: dcc.list(),
+        lambda dcc: dcc.read(),
+        lambda dcc: dcc.update({"registry.example.org": {}}),
+        lambda dcc: dcc.delete("registry.example.org"),
+    ],
+)
+def test_export_failure_propagates(monkeypatch, call):
+    def _check_output(cmd, **_):
+        stderr = b"Error: secret not found" if cmd[1] == "read" else b"denied"
+        raise CalledProcessError(1, cmd, stderr=stderr)
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    with pytest.raises(CalledProcessError):
+        call(DCC("test/service"))
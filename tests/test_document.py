@@ -0,0 +1,223 @@
+# single-document storage layout test cases
+
+import json
+import os
+import time
+from contextlib import nullcontext
+from hashlib import sha256
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from docker_credential_chamber import document
+from docker_credential_chamber.backend import (
+    BackendError,
+    ChamberBackend,
+    MemoryBackend,
+)
+from docker_credential_chamber.dcc import DCC, encode_server
+from docker_credential_chamber.document import HEADER, DocumentBackend, migrate
+from docker_credential_chamber.replica import ReplicatedBackend
+
+SERVERS = [f"r{i}.example.org" for i in range(20)]
+
+
+def _creds(server):
+    return json.dumps({"Username": "user", "Secret": f"secret-{server}"})
+
+
+@pytest.fixture(autouse=True)
+def runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setattr(document, "READ_DELAY", 0)
+
+
+def test_chunked_roundtrip():
+    store = MemoryBackend("test/service")
+    backend = DocumentBackend(store, chunk_size=100)
+    keys = {encode_server(s): _creds(s) for s in SERVERS}
+    backend.write_keys(keys)
+    header = json.loads(store.read_key(HEADER))
+    assert header["version"] == 1
+    assert header["chunks"] > 1
+    assert all(len(v) <= 100 for k, v in store.export().items() if k != HEADER)
+    assert backend.export() == keys
+    assert not any(k in store.export() for k in keys)
+
+
+def test_read_is_one_export():
+    store = MemoryBackend("test/service")
+    backend = DocumentBackend(store, chunk_size=100)
+    backend.write_keys({encode_server(s): _creds(s) for s in SERVERS})
+    store.calls.clear()
+    assert backend.read_key(encode_server(SERVERS[3])) == _creds(SERVERS[3])
+    assert backend.export()
+    assert store.calls == {"export": 2}
+
+
+def test_old_chunks_removed():
+    store = MemoryBackend("test/service")
+    backend = DocumentBackend(store, chunk_size=100)
+    backend.write_keys({encode_server(s): _creds(s) for s in SERVERS})
+    backend.delete_key(encode_server(SERVERS[0]))
+    header = json.loads(store.read_key(HEADER))
+    assert header["version"] == 2
+    chunks = [k for k in store.export() if k != HEADER]
+    assert all(k.startswith(f"{HEADER}_{header['id']}_") for k in chunks)
+    backend.write_keys(dict.fromkeys(backend.export()))
+    assert store.export() == {}
+    assert not backend.exists()
+
+
+def test_torn_read_retried():
+    store = MemoryBackend("test/service")
+    backend = DocumentBackend(store)
+    backend.write_key("a", "1")
+    chunk = f"{HEADER}_{json.loads(store.read_key(HEADER))['id']}_0"
+    good = store.read_key(chunk)
+    store.write_key(chunk, "{}")
+    with pytest.raises(BackendError):
+        backend.read_key("a")
+
+    class Healing(MemoryBackend):
+        def export(self):
+            data = super().export()
+            self.write_key(chunk, good)
+            return data
+
+    healing = Healing("test/service", services=store.services)
+    assert DocumentBackend(healing).read_key("a") == "1"
+    assert healing.calls["export"] == 2
+
+
+def test_failed_export_keeps_document():
+    store = MemoryBackend("test/service")
+    DocumentBackend(store).write_keys({"a": "1", "b": "2"})
+
+    class Failing(MemoryBackend):
+        def export(self):
+            raise BackendError("denied")
+
+    failing = Failing("test/service", services=store.services)
+    with pytest.raises(BackendError):
+        DocumentBackend(failing).write_key("c", "3")
+    assert DocumentBackend(store).export() == {"a": "1", "b": "2"}
+
+
+def test_old_layout_header_read():
+    store = MemoryBackend("test/service")
+    text = json.dumps({"a": "1"})
+    store.write_key(f"{HEADER}_3_0", text)
+    header = dict(
+        layout=1, version=3, chunks=1, sha256=sha256(text.encode()).hexdigest()
+    )
+    store.write_key(HEADER, json.dumps(header))
+    backend = DocumentBackend(store)
+    assert backend.export() == {"a": "1"}
+    backend.write_key("b", "2")
+    assert backend.export() == {"a": "1", "b": "2"}
+    assert f"{HEADER}_3_0" not in store.export()
+
+
+def test_concurrent_writers_keep_both_changes(monkeypatch):
+    # writers on two hosts do not share the service lock
+    monkeypatch.setattr(document, "ServiceLock", lambda *args: nullcontext())
+    services = {}
+    other = DocumentBackend(
+        MemoryBackend("test/service", services=services), chunk_size=10
+    )
+    other.write_keys({"a": "1", "b": "2"})
+
+    class Racing(MemoryBackend):
+        raced = False
+
+        def write_key(self, key, value):
+            super().write_key(key, value)
+            if not self.raced and key != HEADER:
+                # the other host commits between our chunks and header
+                self.raced = True
+                other.write_key("c", "3")
+
+    racing = Racing("test/service", services=services)
+    DocumentBackend(racing, chunk_size=10).write_key("d", "4")
+    assert other.export() == {"a": "1", "b": "2", "c": "3", "d": "4"}
+    stored = services["test/service"]
+    header = json.loads(stored[HEADER])
+    assert header["version"] == 3
+    chunks = [k for k in stored if k != HEADER]
+    assert all(k.startswith(f"{HEADER}_{header['id']}_") for k in chunks)
+
+
+def test_changes_start_from_primary():
+    class Slow(MemoryBackend):
+        def export(self):
+            time.sleep(0.1)
+            return super().export()
+
+    primary = Slow("test/service")
+    replica = MemoryBackend("test/service")
+    DocumentBackend(primary).write_keys({"a": "1", "b": "2"})
+    DocumentBackend(replica).write_keys({"a": "stale"})
+    backend = DocumentBackend(ReplicatedBackend(primary, [replica], 0.01))
+    # reads take the first answer, which may be a stale replica's
+    assert backend.export() == {"a": "stale"}
+    backend.write_key("c", "3")
+    assert DocumentBackend(primary).export() == {"a": "1", "b": "2", "c": "3"}
+
+
+def test_chunk_starting_with_dash(tmp_path):
+    fake_chamber = Path(__file__).parents[1] / "benchmarks" / "fake_chamber.py"
+    env = {**os.environ, "FAKE_CHAMBER_STORE": str(tmp_path / "store.json")}
+    store = ChamberBackend("test/service", str(fake_chamber), env)
+    backend = DocumentBackend(store, chunk_size=10)
+    # the document '{"a":"xxxx-yyyy"}' splits right before the "-"
+    backend.write_key("a", "xxxx-yyyy")
+    assert any(v.startswith("-") for v in store.export().values())
+    assert backend.read_key("a") == "xxxx-yyyy"
+    backend.delete_key("a")
+    assert store.export() == {}
+
+
+def test_migrate_both_ways():
+    store = MemoryBackend("test/service")
+    keys = {encode_server(s): _creds(s) for s in SERVERS}
+    store.write_keys(keys)
+    assert migrate(store, "document") == sorted(keys)
+    assert list(store.export()) != list(keys)
+    assert DocumentBackend(store).export() == keys
+    assert migrate(store, "keys") == sorted(keys)
+    assert store.export() == keys
+
+
+def test_dcc_document_layout():
+    store = MemoryBackend("test/service")
+    dcc = DCC("test/service", backend=store, layout="document")
+    dcc.update({s: json.loads(_creds(s)) for s in SERVERS})
+    # one document write, then one export to read it back
+    assert store.calls["write_key"] == 2
+    assert dcc.get(SERVERS[0]) == json.loads(_creds(SERVERS[0]))
+    assert sorted(dcc.list()) == sorted(SERVERS)
+    dcc.put(SERVERS[0], "user", "changed")
+    dcc.delete(SERVERS[1])
+    assert dcc.get(SERVERS[0])["Secret"] == "changed"
+    assert SERVERS[1] not in dcc.list()
+
+
+def test_cli_migrate_layout(tmp_path, monkeypatch):
+    from docker_credential_chamber.cli import cli
+
+    path = tmp_path / "store.json"
+    monkeypatch.setenv("DOCKER_CREDENTIALS_MEMORY_FILE", str(path))
+    store = MemoryBackend("test/service", path)
+    store.write_key(encode_server(SERVERS[0]), _creds(SERVERS[0]))
+    args = ["--backend", "memory", "--service", "test/service"]
+    result = CliRunner().invoke(cli, [*args, "migrate-layout", "document"])
+    assert result.exit_code == 0, result.output
+    assert "migrated 1 credentials to document" in result.output
+    assert HEADER in store.export()
+    result = CliRunner().invoke(
+        cli, [*args, "--layout", "document", "get"], input=SERVERS[0]
+    )
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout) == json.loads(_creds(SERVERS[0]))
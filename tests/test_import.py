@@ -0,0 +1,99 @@
+# bulk import test cases
+
+import json
+from base64 import b64encode
+
+import pytest
+from click.testing import CliRunner
+
+from docker_credential_chamber import cli
+from docker_credential_chamber.backend import MemoryBackend
+from docker_credential_chamber.dcc import DCC, encode_server
+from docker_credential_chamber.importer import (
+    ImportDataError,
+    read_config,
+    read_ndjson,
+    strip_auths,
+)
+
+CONFIG = {
+    "auths": {
+        "basic.example.org": {"auth": b64encode(b"user:pass:word").decode()},
+        "token.example.org": {"identitytoken": "tok"},
+        "helper.example.org": {},
+    },
+    "credsStore": "desktop",
+}
+
+
+def test_read_config():
+    secrets, skipped = read_config(json.dumps(CONFIG))
+    assert secrets == {
+        "basic.example.org": {"Username": "user", "Secret": "pass:word"},
+        "token.example.org": {"Username": "<token>", "Secret": "tok"},
+    }
+    assert skipped == ["helper.example.org"]
+
+
+def test_read_ndjson():
+    lines = [
+        '{"ServerURL": "a.example.org", "Username": "a", "Secret": "s"}\n',
+        "\n",
+        '{"ServerURL": "b.example.org", "Username": "b", "Secret": "s"}\n',
+    ]
+    assert read_ndjson(lines) == {
+        "a.example.org": {"Username": "a", "Secret": "s"},
+        "b.example.org": {"Username": "b", "Secret": "s"},
+    }
+    with pytest.raises(ImportDataError):
+        read_ndjson(['{"ServerURL": "a.example.org"}'])
+
+
+def test_strip_auths():
+    config = strip_auths(CONFIG, ["basic.example.org"])
+    assert config["auths"]["basic.example.org"] == {}
+    assert config["auths"]["token.example.org"] == {"identitytoken": "tok"}
+    assert CONFIG["auths"]["basic.example.org"]
+
+
+def test_update_single_verify(monkeypatch):
+    verified = []
+    monkeypatch.setattr(
+        DCC, "verify", lambda self, changes: verified.append(changes)
+    )
+    memory = MemoryBackend("test/service")
+    key = encode_server("existing.example.org")
+    memory.write_key(key, json.dumps({"Username": "u", "Secret": "s"}))
+    secrets = {
+        f"registry{i}.example.org": {"Username": "u", "Secret": "s"}
+        for i in range(50)
+    }
+    DCC("test/service", backend=memory).update(secrets)
+    assert memory.calls["write_key"] == 51
+    assert memory.calls["export"] == 1
+    assert verified == [secrets]
+
+
+def test_cli_import_strip(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOCKER_CREDENTIALS_BACKEND", "memory")
+    monkeypatch.setenv(
+        "DOCKER_CREDENTIALS_MEMORY_FILE", str(tmp_path / "m.json")
+    )
+    monkeypatch.setenv("DOCKER_CREDENTIALS_SOCKET", str(tmp_path / "none.sock"))
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(CONFIG))
+    result = CliRunner().invoke(
+        cli, ["import", "--strip", str(config_file)], catch_exceptions=False
+    )
+    assert result.exit_code == 0
+    config = json.loads(config_file.read_text())
+    assert config["auths"] == {
+        "basic.example.org": {},
+        "token.example.org": {},
+        "helper.example.org": {},
+    }
+    result = CliRunner().invoke(cli, ["list"], catch_exceptions=False)
+    assert json.loads(result.stdout) == {
+        "basic.example.org": "user",
+        "token.example.org": "<token>",
+    }
@@ -0,0 +1,89 @@
+# concurrent store/erase and service lock test cases
+
+import os
+import threading
+import time
+
+import pytest
+
+from docker_credential_chamber.backend import MemoryBackend
+from docker_credential_chamber.dcc import DCC
+from docker_credential_chamber import lock
+from docker_credential_chamber.lock import LockTimeout, ServiceLock, lock_dir
+
+
+def test_put_touches_only_its_key():
+    memory = MemoryBackend("test/service")
+    dcc = DCC("test/service", backend=memory)
+    dcc.put("a.example.org", "user", "secret")
+    dcc.delete("a.example.org")
+    assert memory.calls["write_key"] == 1
+    assert memory.calls["delete_key"] == 1
+    assert memory.calls["exists"] == 0
+    assert memory.calls["export"] == 0
+
+
+def test_parallel_puts_keep_every_key():
+    services = {}
+
+    def _put(i):
+        backend = MemoryBackend("test/service", services=services)
+        DCC("test/service", backend=backend).put(f"r{i}.example.org", "u", "s")
+
+    threads = [threading.Thread(target=_put, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    dcc = DCC(
+        "test/service", backend=MemoryBackend("test/service", services=services)
+    )
+    assert sorted(dcc.list()) == sorted(f"r{i}.example.org" for i in range(8))
+
+
+def test_lock_timeout(tmp_path):
+    with ServiceLock("test/service", path=tmp_path):
+        with pytest.raises(LockTimeout):
+            ServiceLock("test/service", timeout=0.05, path=tmp_path).acquire()
+    with ServiceLock("other/service", timeout=0.05, path=tmp_path) as lock:
+        assert lock.waited < 0.05
+
+
+def test_lock_reports_wait(tmp_path):
+    holder = ServiceLock("test/service", path=tmp_path).acquire()
+    timer = threading.Timer(0.1, holder.release)
+    timer.start()
+    start = time.monotonic()
+    with ServiceLock("test/service", timeout=5, path=tmp_path) as lock:
+        assert 0.05 < lock.waited <= time.monotonic() - start
+    timer.join()
+
+
+def test_update_takes_lock(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    memory = MemoryBackend("test/service")
+    dcc = DCC("test/service", backend=memory, lock_timeout=0.05)
+    creds = {"Username": "user", "Secret": "secret"}
+    with dcc.lock():
+        with pytest.raises(LockTimeout):
+            dcc.update({"a.example.org": creds})
+    assert dcc.update({"a.example.org": creds}) < 0.05
+    assert dcc.list() == {"a.example.org": "user"}
+
+
+def test_lock_dir_fallback_must_be_private(monkeypatch, tmp_path):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(lock.tempfile, "gettempdir", lambda: str(tmp_path))
+    path = lock_dir()
+    assert path.parent == tmp_path
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    assert lock_dir() == path
+    path.chmod(0o755)
+    with pytest.raises(PermissionError):
+        lock_dir()
+    path.rmdir()
+    target = tmp_path / "elsewhere"
+    target.mkdir(mode=0o700)
+    path.symlink_to(target)
+    with pytest.raises(PermissionError):
+        lock_dir()
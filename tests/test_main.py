@@ -0,0 +1,61 @@
+# fast-start entry point test cases
+
+import io
+import json
+import subprocess
+import sys
+
+from docker_credential_chamber import main
+
+# seconds allowed for importing the entry point and reading options
+IMPORT_BUDGET = 0.15
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from docker_credential_chamber import main
+main._options({})
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def test_import_budget():
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_PROBE])
+    probe = json.loads(output)
+    for module in ["click", "logging", "docker_credential_chamber.cli"]:
+        assert module not in probe["modules"]
+    assert "docker_credential_chamber.exception_handler" not in probe["modules"]
+    assert probe["elapsed"] < IMPORT_BUDGET
+
+
+def test_options_defer_to_click():
+    for env in [
+        {"DOCKER_CREDENTIALS_DEBUG": "1"},
+        {"DOCKER_CREDENTIALS_LOGFILE": "stderr"},
+        {"DOCKER_CREDENTIALS_BACKEND": "unknown"},
+        {"DOCKER_CREDENTIALS_CACHE_TTL": "soon"},
+    ]:
+        try:
+            main._options(env)
+        except ValueError:
+            continue
+        raise AssertionError(f"{env} accepted")
+
+
+def test_protocol_roundtrip(tmp_path, monkeypatch):
+    env = {
+        "DOCKER_CREDENTIALS_BACKEND": "memory",
+        "DOCKER_CREDENTIALS_MEMORY_FILE": str(tmp_path / "store.json"),
+        "DOCKER_CREDENTIALS_SOCKET": str(tmp_path / "none.sock"),
+    }
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    options, socket = main._options(env)
+    creds = {"ServerURL": "r.example.org", "Username": "u", "Secret": "s"}
+    stdin = io.StringIO(json.dumps(creds))
+    assert main.protocol("store", options, socket, stdin) == 0
+    stdin = io.StringIO("r.example.org\n")
+    stdout = io.StringIO()
+    assert main.protocol("get", options, socket, stdin, stdout) == 0
+    assert json.loads(stdout.getvalue()) == {"Username": "u", "Secret": "s"}
@@ -0,0 +1,231 @@
+# native backend test cases against stub HTTP servers
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from docker_credential_chamber.dcc import DCC
+from docker_credential_chamber.ssm import SSMBackend, sign
+from docker_credential_chamber.vault import VaultBackend
+
+CREDS = {"Username": "user", "Secret": "secret"}
+SERVICE = "docker/credentials"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+
+class VaultHandler(StubHandler):
+    """KV version 2 secrets stored in server.secrets by path"""
+
+    def do_GET(self):
+        data = self.server.secrets.get(self.path)
+        if data is None:
+            return self.reply(404, {"errors": []})
+        self.reply(200, {"data": {"data": data, "metadata": {}}})
+
+    def do_PATCH(self):
+        assert self.headers["X-Vault-Token"] == "test-token"
+        patch = json.loads(self.body())["data"]
+        data = self.server.secrets.get(self.path)
+        if data is None:
+            return self.reply(404, {"errors": []})
+        for key, value in patch.items():
+            if value is None:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        self.reply(200, {"data": {}})
+
+    def do_POST(self):
+        request = json.loads(self.body())
+        if (
+            request["options"].get("cas") == 0
+            and self.path in self.server.secrets
+        ):
+            return self.reply(400, {"errors": ["check-and-set mismatch"]})
+        self.server.secrets[self.path] = request["data"]
+        self.reply(200, {"data": {}})
+
+
+class SSMHandler(StubHandler):
+    """parameter store with parameters in server.parameters by name"""
+
+    def do_POST(self):
+        body = self.body()
+        headers = {k: self.headers[k] for k in ("Content-Type", "X-Amz-Target")}
+        expected = sign(
+            headers,
+            body,
+            self.headers["Host"],
+            "us-test-1",
+            "AKIDTEST",
+            "test-secret",
+            now=self.server.now(self.headers["X-Amz-Date"]),
+        )
+        if self.headers["Authorization"] != expected:
+            return self.reply(403, {"__type": "InvalidSignatureException"})
+        action = self.headers["X-Amz-Target"].split(".")[1]
+        request = json.loads(body)
+        parameters = self.server.parameters
+        if action == "GetParameter":
+            if request["Name"] not in parameters:
+                return self.reply(400, {"__type": "ParameterNotFound"})
+            value = parameters[request["Name"]]
+            self.reply(
+                200, {"Parameter": {"Name": request["Name"], "Value": value}}
+            )
+        elif action == "PutParameter":
+            assert request["Type"] == "SecureString"
+            parameters[request["Name"]] = request["Value"]
+            self.reply(200, {"Version": 1})
+        elif action == "DeleteParameter":
+            if parameters.pop(request["Name"], None) is None:
+                return self.reply(400, {"__type": "ParameterNotFound"})
+            self.reply(200, {})
+        elif action == "DescribeParameters":
+            (path,) = request["ParameterFilters"][0]["Values"]
+            names = sorted(n for n in parameters if n.startswith(path + "/"))
+            page = [{"Name": n, "Version": len(parameters[n])} for n in names]
+            self.reply(200, {"Parameters": page})
+        elif action == "GetParametersByPath":
+            names = sorted(
+                n for n in parameters if n.startswith(request["Path"] + "/")
+            )
+            start = int(request.get("NextToken", 0))
+            end = start + request["MaxResults"]
+            page = [
+                {"Name": n, "Value": parameters[n]} for n in names[start:end]
+            ]
+            response = {"Parameters": page}
+            if end < len(names):
+                response["NextToken"] = str(end)
+            self.reply(200, response)
+        else:
+            self.reply(400, {"__type": "InvalidAction"})
+
+
+def _serve(handler, **attrs):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.connections = 0
+    for name, value in attrs.items():
+        setattr(server, name, value)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def vault_server():
+    server = _serve(VaultHandler, secrets={})
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ssm_server():
+    from datetime import datetime, timezone
+
+    def _now(amz_date):
+        return datetime.strptime(amz_date, "%Y%m%dT%H%M%SZ").replace(
+            tzinfo=timezone.utc
+        )
+
+    server = _serve(SSMHandler, parameters={}, now=_now)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def vault(vault_server):
+    host, port = vault_server.server_address
+    env = {"VAULT_ADDR": f"http://{host}:{port}", "VAULT_TOKEN": "test-token"}
+    return VaultBackend(SERVICE, env)
+
+
+@pytest.fixture
+def ssm(ssm_server):
+    host, port = ssm_server.server_address
+    env = {
+        "AWS_ACCESS_KEY_ID": "AKIDTEST",
+        "AWS_SECRET_ACCESS_KEY": "test-secret",
+        "AWS_REGION": "us-test-1",
+        "AWS_ENDPOINT_URL_SSM": f"http://{host}:{port}",
+    }
+    return SSMBackend(SERVICE, env)
+
+
+@pytest.mark.parametrize("name", ["vault", "ssm"])
+def test_native_backend(name, request):
+    backend = request.getfixturevalue(name)
+    assert not backend.exists()
+    assert backend.read_key("key1") is None
+    assert backend.export() == {}
+    backend.write_key("key1", "value1")
+    backend.write_key("key2", "value2")
+    assert backend.exists()
+    assert backend.read_key("key1") == "value1"
+    assert backend.export() == {"key1": "value1", "key2": "value2"}
+    backend.delete_key("key1")
+    assert backend.read_key("key1") is None
+    assert backend.export() == {"key2": "value2"}
+    assert backend.pool.connections == 1
+
+
+def test_vault_layout(vault, vault_server):
+    vault.write_key("key1", "value1")
+    assert vault_server.secrets == {
+        f"/v1/secret/data/{SERVICE}": {"key1": "value1"}
+    }
+
+
+def test_ssm_layout(ssm, ssm_server):
+    ssm.write_key("key1", "value1")
+    assert ssm_server.parameters == {f"/{SERVICE}/key1": "value1"}
+
+
+def test_ssm_versions(ssm, ssm_server):
+    ssm.write_key("key1", "value1")
+    # the stub's versions are value lengths
+    assert ssm.versions() == {"key1": 6}
+
+
+def test_ssm_export_pages(ssm, ssm_server):
+    for i in range(25):
+        ssm_server.parameters[f"/{SERVICE}/key{i}"] = f"value{i}"
+    assert len(ssm.export()) == 25
+
+
+@pytest.mark.parametrize("name", ["vault", "ssm"])
+def test_native_dcc(name, request, monkeypatch):
+    monkeypatch.setattr(DCC, "verify", lambda self, changes: (1, 0))
+    dcc = DCC(SERVICE, backend=request.getfixturevalue(name))
+    dcc.put("registry.example.org", "user", "secret")
+    assert dcc.get("registry.example.org") == CREDS
+    assert dcc.list() == {"registry.example.org": "user"}
+    dcc.delete("registry.example.org")
+    assert dcc.list() == {}
@@ -0,0 +1,162 @@
+# rate limiter and throttling retry test cases
+
+import json
+import subprocess
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from docker_credential_chamber import backend, ratelimit
+from docker_credential_chamber.backend import (
+    BackendError,
+    MemoryBackend,
+    Throttled,
+    throttled,
+)
+from docker_credential_chamber.cache import CredentialCache
+from docker_credential_chamber.dcc import DCC
+from docker_credential_chamber.ratelimit import LimitedBackend, RateLimiter
+from docker_credential_chamber.trace import Tracer
+
+
+class ThrottledBackend(MemoryBackend):
+    """memory backend refusing the first failures reads as throttled"""
+
+    def __init__(self, service, failures, error=Throttled("rate exceeded")):
+        super().__init__(service)
+        self.failures = failures
+        self.error = error
+
+    def read_key(self, key):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return super().read_key(key)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ratelimit, "RETRY_DELAY", 0)
+
+
+def test_throttled_errors():
+    assert throttled(Throttled("chamber read"))
+    assert throttled(BackendError("ssm GetParameter failed: 400 Throttling"))
+    assert throttled(BackendError("vault GET /v1/secret failed: 429 "))
+    assert not throttled(BackendError("ssm parameter not found"))
+    error = subprocess.CalledProcessError(1, ["chamber", "read", "throttle"])
+    assert not throttled(error)
+    error.stderr = b"ThrottlingException: Rate exceeded"
+    assert throttled(error)
+
+
+def test_chamber_throttling_raises(monkeypatch):
+    def _check_output(cmd, **_):
+        raise subprocess.CalledProcessError(
+            1, cmd, stderr=b"ThrottlingException: Rate exceeded"
+        )
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    chamber = backend.ChamberBackend("test/service")
+    # throttling is not mistaken for a missing key or service
+    with pytest.raises(Throttled):
+        chamber.read_key("key")
+    with pytest.raises(Throttled):
+        chamber.export()
+
+
+def test_retry_throttled():
+    tracer = Tracer()
+    memory = ThrottledBackend("test/service", failures=2)
+    memory.write_key("key", "value")
+    limited = LimitedBackend(memory, retries=3, tracer=tracer)
+    assert limited.read_key("key") == "value"
+    assert tracer.counters["backend_retries"] == 2
+
+
+def test_retry_bounded():
+    memory = ThrottledBackend("test/service", failures=5)
+    with pytest.raises(Throttled):
+        LimitedBackend(memory, retries=2).read_key("key")
+    assert memory.failures == 2
+
+
+def test_other_errors_not_retried():
+    memory = ThrottledBackend(
+        "test/service", failures=2, error=BackendError("denied")
+    )
+    with pytest.raises(BackendError):
+        LimitedBackend(memory, retries=3).read_key("key")
+    assert memory.failures == 1
+
+
+def test_limiter_burst_then_rate(tmp_path):
+    limiter = RateLimiter("memory", rate=20, burst=2, path=tmp_path)
+    start = time.monotonic()
+    waits = [limiter.acquire() for _ in range(4)]
+    elapsed = time.monotonic() - start
+    assert waits[:2] == [0, 0]
+    assert all(wait > 0 for wait in waits[2:])
+    assert elapsed >= 0.09
+    stats = limiter.stats()
+    assert stats["calls"] == 4
+    assert stats["delayed"] == 2
+    # time spent between calls refills part of the delay
+    assert stats["delayed_seconds"] > 0
+
+
+def test_limiter_shared(tmp_path):
+    # separate instances, as in separate processes, draw from one bucket
+    limiters = [RateLimiter("memory", 50, 1, path=tmp_path) for _ in range(5)]
+    threads = [threading.Thread(target=limiter.acquire) for limiter in limiters]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start >= 0.07
+    assert RateLimiter("memory", 50, 1, path=tmp_path).stats()["calls"] == 5
+
+
+def test_dcc_rate(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    tracer = Tracer(tmp_path / "trace.jsonl")
+    dcc = DCC(
+        "test/service",
+        backend=MemoryBackend("test/service"),
+        rate=100,
+        burst=1,
+        trace=tracer,
+    )
+    for i in range(3):
+        dcc.put(f"r{i}.example.org", "user", "secret")
+    assert tracer.counters["throttle_waits"] > 0
+    assert tracer.counters["throttled_ms"] > 0
+    assert dcc.limiter("memory").stats()["delayed"] > 0
+
+
+def test_cli_ratelimit(monkeypatch, tmp_path):
+    from docker_credential_chamber.cli import cli
+
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    RateLimiter("memory", 10, path=tmp_path / "docker-credential-chamber")
+    result = CliRunner().invoke(
+        cli, ["--backend", "memory", "--rate", "10", "ratelimit"]
+    )
+    assert result.exit_code == 0, result.output
+    stats = json.loads(result.stdout)
+    assert stats["rate"] == 10
+    assert stats["calls"] == 0
+
+
+def test_limiter_survives_cache_eviction(monkeypatch, tmp_path):
+    pytest.importorskip("cryptography")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    limiter = RateLimiter("chamber", 50, 1)
+    limiter.acquire()
+    cache = CredentialCache("test/service", {"VAULT_TOKEN": "t"}, size=2)
+    for i in range(3):
+        cache.put(f"key{i}", i)
+    assert limiter.stats()["calls"] == 1
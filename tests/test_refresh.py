@@ -0,0 +1,165 @@
+# stale-while-revalidate refresh test cases
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from docker_credential_chamber import backend
+from docker_credential_chamber.backend import MemoryBackend
+from docker_credential_chamber.cache import CredentialCache, MemoryCache
+from docker_credential_chamber.dcc import DCC, EXPORT, encode_server
+
+SERVER = "registry.example.org"
+
+
+def _creds(secret):
+    return {"Username": "user", "Secret": secret}
+
+
+@pytest.fixture
+def dcc(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    memory = MemoryBackend("test/service")
+    memory.write_key(encode_server(SERVER), json.dumps(_creds("one")))
+    dcc = DCC("test/service", backend=memory, refresh_after=1)
+    dcc.cache = MemoryCache()
+    dcc.refresh_in = "inline"
+    return dcc
+
+
+def _age(dcc, key, seconds):
+    entry = dcc.cache.get(key)
+    entry["at"] -= seconds
+    dcc.cache.put(key, entry)
+
+
+def test_fresh_entry_served(dcc):
+    assert dcc.get(SERVER) == _creds("one")
+    reads = dcc.backend.calls["read_key"]
+    assert dcc.get(SERVER) == _creds("one")
+    assert dcc.backend.calls["read_key"] == reads
+    assert dcc.backend.calls["versions"] == 0
+
+
+def test_stale_entry_served_then_refreshed(dcc):
+    dcc.get(SERVER)
+    key = encode_server(SERVER)
+    dcc.backend.write_key(key, json.dumps(_creds("two")))
+    _age(dcc, key, 2)
+    # the stale value is returned; the refresh replaces it
+    assert dcc.get(SERVER) == _creds("one")
+    assert dcc.get(SERVER) == _creds("two")
+    assert dcc.cache.get(key)["version"] == [
+        "test/service",
+        dcc.backend.versions()[key],
+    ]
+
+
+def test_unchanged_entry_not_reread(dcc):
+    dcc.get(SERVER)
+    key = encode_server(SERVER)
+    _age(dcc, key, 2)
+    dcc.get(SERVER)
+    # the first refresh learns the version; later ones only compare it
+    _age(dcc, key, 2)
+    reads = dcc.backend.calls["read_key"]
+    assert dcc.get(SERVER) == _creds("one")
+    assert dcc.backend.calls["read_key"] == reads
+    assert dcc.backend.calls["versions"] == 2
+    assert time.time() - dcc.cache.get(key)["at"] < 1
+
+
+def test_deleted_entry_dropped(dcc):
+    dcc.get(SERVER)
+    key = encode_server(SERVER)
+    dcc.backend.delete_key(key)
+    _age(dcc, key, 2)
+    dcc.get(SERVER)
+    assert dcc.cache.get(key) is None
+
+
+def test_list_refreshed(dcc):
+    assert dcc.list() == {SERVER: "user"}
+    dcc.backend.write_key(
+        encode_server("other.example.org"), json.dumps(_creds("x"))
+    )
+    _age(dcc, EXPORT, 2)
+    dcc.list()
+    assert dcc.list() == {SERVER: "user", "other.example.org": "user"}
+
+
+def test_failed_refresh_backs_off(dcc):
+    dcc.get(SERVER)
+    key = encode_server(SERVER)
+    dcc.backend.write_key(key, json.dumps(_creds("two")))
+
+    def _fail(keys):
+        del dcc.revalidate
+        raise backend.BackendError("unavailable")
+
+    dcc.revalidate = _fail
+    _age(dcc, key, 2)
+    assert dcc.get(SERVER) == _creds("one")
+    # the failure holds off further refreshes for refresh_after seconds
+    assert dcc.get(SERVER) == _creds("one")
+    assert dcc.get(SERVER) == _creds("one")
+    assert dcc.backend.calls["versions"] == 0
+    time.sleep(1.1)
+    assert dcc.get(SERVER) == _creds("one")
+    assert dcc.get(SERVER) == _creds("two")
+
+
+def test_memory_cache_shared_by_threads():
+    cache = MemoryCache(size=4)
+
+    def _churn(i):
+        for n in range(2000):
+            key = f"{i}-{n % 8}"
+            cache.put(key, n)
+            cache.get(key)
+            cache.invalidate(f"{i}-{(n + 3) % 8}")
+
+    threads = [threading.Thread(target=_churn, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache.entries) <= 4
+
+
+def test_refresh_in_child_process(tmp_path, monkeypatch):
+    pytest.importorskip("cryptography")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setenv("VAULT_TOKEN", "test-token")
+    memory = MemoryBackend("test/service", tmp_path / "store.json")
+    key = encode_server(SERVER)
+    memory.write_key(key, json.dumps(_creds("one")))
+    dcc = DCC("test/service", backend=memory, cache=True, refresh_after=1)
+    assert isinstance(dcc.cache, CredentialCache)
+    dcc.get(SERVER)
+    memory.write_key(key, json.dumps(_creds("two")))
+    _age(dcc, key, 2)
+    assert dcc.get(SERVER) == _creds("one")
+    deadline = time.monotonic() + 5
+    while dcc.cache.get(key)["value"] != _creds("two"):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    try:
+        os.waitpid(-1, 0)
+    except ChildProcessError:
+        pass
+
+
+def test_chamber_versions(monkeypatch):
+    def _check_output(cmd, **_):
+        assert cmd[1:] == ["list", "test/service"]
+        return (
+            b"Key\t\tVersion\t\tLastModified\t\tUser\n"
+            b"abc\t\t3\t\t2024-01-01 00:00:00\t\tarn:user\n"
+        )
+
+    monkeypatch.setattr(backend, "check_output", _check_output)
+    assert backend.ChamberBackend("test/service").versions() == {"abc": "3"}
@@ -0,0 +1,167 @@
+# replicated backend test cases
+
+import json
+import time
+
+import pytest
+
+from docker_credential_chamber.backend import (
+    BackendError,
+    ChamberBackend,
+    MemoryBackend,
+)
+from docker_credential_chamber.dcc import DCC
+from docker_credential_chamber.replica import ReplicatedBackend, open_replica
+from docker_credential_chamber.trace import Tracer
+
+
+class SlowBackend(MemoryBackend):
+    """memory backend taking DELAY seconds per read"""
+
+    DELAY = 1
+
+    def read_key(self, key):
+        time.sleep(self.DELAY)
+        return super().read_key(key)
+
+
+class BrokenBackend(MemoryBackend):
+    def read_key(self, key):
+        raise BackendError("unavailable")
+
+    def write_key(self, key, value):
+        raise BackendError("unavailable")
+
+
+def _replicated(primary, *replicas, tracer=None):
+    for backend in [primary, *replicas]:
+        backend.write_key("key", "value")
+    return ReplicatedBackend(primary, list(replicas), 0.05, tracer)
+
+
+def test_hedged_read():
+    tracer = Tracer()
+    replica = MemoryBackend("test/service")
+    backend = _replicated(SlowBackend("test/service"), replica, tracer=tracer)
+    start = time.monotonic()
+    assert backend.read_key("key") == "value"
+    assert time.monotonic() - start < SlowBackend.DELAY / 2
+    assert replica.calls["read_key"] == 1
+    assert tracer.counters["hedged"] == 1
+
+
+def test_fast_primary_not_hedged():
+    replica = MemoryBackend("test/service")
+    backend = _replicated(MemoryBackend("test/service"), replica)
+    assert backend.read_key("key") == "value"
+    assert replica.calls["read_key"] == 0
+
+
+def test_failed_primary_falls_back():
+    primary = BrokenBackend("test/service")
+    replica = MemoryBackend("test/service")
+    replica.write_key("key", "value")
+    backend = ReplicatedBackend(primary, [replica], hedge_delay=10)
+    start = time.monotonic()
+    assert backend.read_key("key") == "value"
+    assert time.monotonic() - start < 1
+
+
+def test_all_failed():
+    backend = ReplicatedBackend(
+        BrokenBackend("test/service"), [BrokenBackend("test/service")]
+    )
+    with pytest.raises(BackendError):
+        backend.read_key("key")
+
+
+def test_replica_miss_waits_for_primary():
+    primary = SlowBackend("test/service")
+    primary.write_key("key", "value")
+    replica = MemoryBackend("test/service")
+    backend = ReplicatedBackend(primary, [replica], 0.05)
+    # the replica missed the write; its answer must not win
+    assert backend.read_key("key") == "value"
+    assert replica.calls["read_key"] == 1
+    with pytest.raises(BackendError):
+        ReplicatedBackend(
+            BrokenBackend("test/service"), [BrokenBackend("test/service")]
+        ).read_key("key")
+    backend = ReplicatedBackend(BrokenBackend("test/service"), [replica])
+    assert backend.read_key("key") is None
+
+
+def test_written_keys_read_from_primary(capsys):
+    class Lagging(MemoryBackend):
+        def write_key(self, key, value):
+            raise BackendError("unavailable")
+
+    primary = SlowBackend("test/service")
+    replica = Lagging("test/service")
+    replica.services["test/service"] = {"key": "old"}
+    backend = ReplicatedBackend(primary, [replica], 0.05)
+    backend.write_key("key", "new")
+    assert "replica lagging write_key failed" in capsys.readouterr().err
+    assert backend.read_key("key") == "new"
+    assert replica.calls["read_key"] == 0
+
+
+def test_versions_from_primary():
+    primary = MemoryBackend("test/service")
+    replica = MemoryBackend("test/service")
+    replica.write_key("key", "value")
+    backend = ReplicatedBackend(primary, [replica], 0)
+    assert backend.versions() == {}
+    assert replica.calls["versions"] == 0
+
+
+def test_writes_mirrored():
+    primary = MemoryBackend("test/service")
+    replicas = [MemoryBackend("test/service") for _ in range(2)]
+    backend = ReplicatedBackend(primary, replicas)
+    backend.write_key("key", "value")
+    assert [b.export() for b in [primary, *replicas]] == [{"key": "value"}] * 3
+    backend.delete_key("key")
+    assert [b.export() for b in [primary, *replicas]] == [{}] * 3
+
+
+def test_replica_write_failure(capsys):
+    primary = MemoryBackend("test/service")
+    backend = ReplicatedBackend(primary, [BrokenBackend("test/service")])
+    backend.write_key("key", "value")
+    assert primary.export() == {"key": "value"}
+    assert "replica broken write_key failed" in capsys.readouterr().err
+    with pytest.raises(BackendError):
+        ReplicatedBackend(BrokenBackend("test/service"), [primary]).write_key(
+            "key", "value"
+        )
+
+
+def test_open_replica(tmp_path):
+    path = tmp_path / "replica.json"
+    replica = open_replica(
+        f"memory,DOCKER_CREDENTIALS_MEMORY_FILE={path}", "test/service", {}
+    )
+    assert replica.path == path
+    replica = open_replica(
+        "cloud-chamber,AWS_REGION=us-west-2", "test/service", {"A": "1"}
+    )
+    assert isinstance(replica, ChamberBackend)
+    assert replica.chamber == "cloud-chamber"
+    assert replica.env == {"A": "1", "AWS_REGION": "us-west-2"}
+    with pytest.raises(BackendError):
+        open_replica("memory,AWS_REGION", "test/service", {})
+
+
+def test_dcc_replicas(tmp_path, monkeypatch):
+    primary = tmp_path / "primary.json"
+    replica = tmp_path / "replica.json"
+    monkeypatch.setenv("DOCKER_CREDENTIALS_MEMORY_FILE", str(primary))
+    dcc = DCC(
+        "test/service",
+        backend="memory",
+        replicas=[f"memory,DOCKER_CREDENTIALS_MEMORY_FILE={replica}"],
+    )
+    dcc.put("registry.example.org", "user", "secret")
+    assert json.loads(primary.read_text()) == json.loads(replica.read_text())
+    assert dcc.get("registry.example.org")["Secret"] == "secret"
@@ -0,0 +1,99 @@
+# service search path test cases
+
+import time
+
+import pytest
+
+from docker_credential_chamber.backend import BackendError, MemoryBackend
+from docker_credential_chamber.dcc import DCC
+
+TEAM = "team/creds"
+ORG = "org/creds"
+PATH = f"{TEAM}:{ORG}"
+
+
+class SlowBackend(MemoryBackend):
+    """memory backend taking DELAY seconds per read"""
+
+    DELAY = 0.05
+
+    def read_key(self, key):
+        time.sleep(self.DELAY)
+        return super().read_key(key)
+
+
+class BrokenBackend(MemoryBackend):
+    def read_key(self, key):
+        raise BackendError("unavailable")
+
+
+@pytest.fixture
+def services():
+    services = {}
+    DCC(ORG, backend=MemoryBackend(ORG, services=services)).update(
+        {
+            "shared.example.org": {"Username": "org", "Secret": "s"},
+            "org.example.org": {"Username": "org", "Secret": "s"},
+        }
+    )
+    DCC(TEAM, backend=MemoryBackend(TEAM, services=services)).put(
+        "shared.example.org", "team", "s"
+    )
+    return services
+
+
+def _dcc(services, cls=MemoryBackend, **kwargs):
+    backends = {name: cls(name, services=services) for name in [TEAM, ORG]}
+    return DCC(PATH, backend=backends, **kwargs)
+
+
+def _single(name, services):
+    return DCC(name, backend=MemoryBackend(name, services=services))
+
+
+def test_get_by_priority(services):
+    dcc = _dcc(services)
+    assert dcc.get("shared.example.org")["Username"] == "team"
+    assert dcc.get("org.example.org")["Username"] == "org"
+    assert dcc.get("missing.example.org") == {}
+
+
+def test_list_merges(services):
+    assert _dcc(services).list() == {
+        "shared.example.org": "team",
+        "org.example.org": "org",
+    }
+
+
+def test_lookups_run_concurrently(services):
+    dcc = _dcc(services, cls=SlowBackend)
+    start = time.monotonic()
+    assert dcc.get("org.example.org")["Username"] == "org"
+    assert time.monotonic() - start < SlowBackend.DELAY * 1.8
+
+
+def test_store_targets_write_service(services):
+    dcc = _dcc(services, write_service=ORG)
+    dcc.put("new.example.org", "user", "s")
+    assert "new.example.org" in _single(ORG, services).list()
+    assert "new.example.org" not in _single(TEAM, services).list()
+
+
+def test_error_before_hit_raises(services):
+    backends = {
+        TEAM: BrokenBackend(TEAM, services=services),
+        ORG: MemoryBackend(ORG, services=services),
+    }
+    with pytest.raises(BackendError):
+        DCC(PATH, backend=backends).get("org.example.org")
+    backends = {
+        TEAM: MemoryBackend(TEAM, services=services),
+        ORG: BrokenBackend(ORG, services=services),
+    }
+    dcc = DCC(PATH, backend=backends)
+    assert dcc.get("shared.example.org")["Username"] == "team"
+
+
+def test_write_service_in_path():
+    with pytest.raises(ValueError):
+        DCC(PATH, backend="memory", write_service="other/creds")
@@ -0,0 +1,135 @@
+# cross-process get coalescing test cases
+
+import threading
+import time
+import uuid
+
+import pytest
+
+from docker_credential_chamber.backend import MemoryBackend
+from docker_credential_chamber.cache import CacheUnavailable, KeyringCache
+from docker_credential_chamber.dcc import DCC, encode_server
+from docker_credential_chamber.singleflight import SingleFlight
+
+SERVER = "registry.example.org"
+CREDS = {"Username": "user", "Secret": "secret"}
+
+
+class SlowBackend(MemoryBackend):
+    """memory backend taking DELAY seconds per read"""
+
+    DELAY = 0.2
+
+    def read_key(self, key):
+        time.sleep(self.DELAY)
+        return super().read_key(key)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    return f"test/{uuid.uuid4().hex}"
+
+
+def _burst(count, lookup):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(lookup()))
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_burst_costs_one_read(service):
+    try:
+        KeyringCache(service, {})
+    except CacheUnavailable as e:
+        pytest.skip(str(e))
+    memory = SlowBackend(service)
+    memory.write_key(
+        encode_server(SERVER), '{"Username": "user", "Secret": "secret"}'
+    )
+    # separate instances, as in separate processes, share one read
+    results = _burst(
+        8,
+        lambda: DCC(
+            service,
+            backend=memory,
+            single_flight=True,
+            cache_store="session-keyring",
+        ).get(SERVER),
+    )
+    assert results == [CREDS] * 8
+    assert memory.calls["read_key"] == 1
+
+
+def test_burst_shares_file_cache(service, monkeypatch):
+    pytest.importorskip("cryptography")
+    monkeypatch.setenv("VAULT_TOKEN", "test-token")
+    memory = SlowBackend(service)
+    memory.write_key(
+        encode_server(SERVER), '{"Username": "user", "Secret": "secret"}'
+    )
+
+    def _get():
+        dcc = DCC(service, backend=memory, cache=True, single_flight=True)
+        assert dcc.flight.handoff is False
+        return dcc.get(SERVER)
+
+    assert _burst(8, _get) == [CREDS] * 8
+    assert memory.calls["read_key"] == 1
+
+
+def test_disabled_without_shared_store(service, capsys):
+    memory = MemoryBackend(service)
+    assert DCC(service, backend=memory, single_flight=True).flight is None
+    assert "single flight disabled" in capsys.readouterr().err
+
+
+def test_misses_shared_without_keyring(service, monkeypatch):
+    pytest.importorskip("cryptography")
+    monkeypatch.setenv("VAULT_TOKEN", "test-token")
+    memory = SlowBackend(service)
+
+    def _get():
+        dcc = DCC(
+            service, backend=memory, cache=True, miss_ttl=10, single_flight=True
+        )
+        assert dcc.flight.handoff is False
+        try:
+            return dcc.get(SERVER)
+        except Exception as e:
+            return e.__class__.__name__
+
+    results = _burst(4, _get)
+    assert len(results) == 4
+    assert memory.calls["read_key"] == 1
+
+
+def test_handoff_not_used_uncontended(service):
+    try:
+        handoff = KeyringCache(
+            service, {}, prefix="docker-credential-chamber-flight"
+        )
+    except CacheUnavailable as e:
+        pytest.skip(str(e))
+    flight = SingleFlight(service, {}, keyring="session")
+    calls = []
+
+    def _fetch():
+        calls.append(1)
+        return CREDS
+
+    assert flight.run("key", _fetch) == (CREDS, False)
+    assert flight.run("key", _fetch) == (CREDS, False)
+    assert len(calls) == 2
+    assert handoff.get("key") is None
+
+
+def test_disabled_by_default(service):
+    memory = MemoryBackend(service)
+    assert DCC(service, backend=memory).flight is None
@@ -0,0 +1,109 @@
+# instrumentation test cases
+
+import json
+from collections import Counter
+
+import pytest
+
+from docker_credential_chamber import dcc as dcc_module
+from docker_credential_chamber.backend import MemoryBackend
+from docker_credential_chamber.dcc import DCC, ChangeError
+
+
+class StaleBackend(MemoryBackend):
+    """memory backend whose first two reads of each key miss"""
+
+    spawns_per_call = 1
+
+    def __init__(self, service):
+        super().__init__(service)
+        self.misses = Counter()
+
+    def read_key(self, key):
+        self.misses[key] += 1
+        if self.misses[key] <= 2:
+            return None
+        return super().read_key(key)
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_trace_spans(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    dcc = DCC(
+        "test/service",
+        backend=StaleBackend("test/service"),
+        readback_delay=0.001,
+        trace=str(path),
+    )
+    dcc.put("r.example.org", "user", "secret")
+    records = _records(path)
+    spans = [r["span"] for r in records]
+    assert spans == [
+        "backend.read_key",
+        "backend.write_key",
+        "backend.read_key",
+        "verify.attempt",
+        "backend.read_key",
+        "verify.attempt",
+        "dcc.verify",
+        "dcc.put",
+    ]
+    put = records[-1]
+    assert put["calls"] == 4
+    assert put["spawns"] == 4
+    assert put["retries"] == 1
+    assert put["ms"] >= sum(r["ms"] for r in records[:2])
+    assert records[0]["backend"] == "stale"
+
+
+class SpawningBackend(MemoryBackend):
+    spawns_per_call = 1
+
+
+def test_trace_counts_inner_calls(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    memory = SpawningBackend("test/service")
+    dcc = DCC(
+        "test/service", backend=memory, layout="document", trace=str(path)
+    )
+    dcc.put("r.example.org", "user", "secret")
+    put = _records(path)[-1]
+    # the document's export, chunk and header writes and header read
+    assert put["spawns"] == sum(memory.calls.values()) > 2
+
+
+def test_trace_counts_replicas(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    opened = []
+
+    def _open(*args, **kwargs):
+        opened.append(SpawningBackend("test/service"))
+        return opened[-1]
+
+    monkeypatch.setattr(dcc_module, "open_backend", _open)
+    monkeypatch.setattr(dcc_module, "open_replica", _open)
+    dcc = DCC("test/service", replicas=["other"], trace=str(path))
+    dcc.put("r.example.org", "user", "secret")
+    put = _records(path)[-1]
+    assert put["spawns"] == sum(sum(b.calls.values()) for b in opened)
+    assert all(b.calls["write_key"] == 1 for b in opened)
+
+
+def test_trace_error(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    memory = MemoryBackend("test/service")
+    dcc = DCC("test/service", backend=memory, trace=str(path))
+    with pytest.raises(ChangeError):
+        dcc.apply({"missing.example.org": None})
+    record = _records(path)[0]
+    assert record["span"] == "backend.delete_key"
+    assert record["error"] == "BackendError"
+
+
+def test_trace_disabled(tmp_path):
+    dcc = DCC("test/service", backend=MemoryBackend("test/service"), retries=0)
+    assert not dcc.tracer.enabled
+    assert isinstance(dcc.backend, MemoryBackend)
@@ -0,0 +1,66 @@
+# registry discovery and cache warming test cases
+
+from docker_credential_chamber.backend import MemoryBackend
+from docker_credential_chamber.cache import MemoryCache
+from docker_credential_chamber.dcc import DCC
+from docker_credential_chamber.registries import (
+    DOCKER_HUB,
+    file_images,
+    image_registry,
+    registries,
+)
+
+DOCKERFILE = """
+ARG BASE=python:3.11
+FROM --platform=linux/amd64 ghcr.io/org/builder:1.2 AS build
+FROM ${BASE}
+FROM build AS test
+COPY --from=registry.example.org:5000/tools/lint /bin/lint /bin/
+COPY --from=build /app /app
+FROM scratch
+"""
+
+COMPOSE = """
+services:
+  web:
+    image: "registry.example.org/web:latest"  # pinned
+  cache:
+    image: redis
+"""
+
+
+def test_image_registry():
+    assert image_registry("redis") == DOCKER_HUB
+    assert image_registry("library/redis:7") == DOCKER_HUB
+    assert image_registry("ghcr.io/org/app") == "ghcr.io"
+    assert image_registry("localhost/app") == "localhost"
+    assert image_registry("host:5000/app") == "host:5000"
+    assert image_registry("docker.io/library/redis") == DOCKER_HUB
+    assert image_registry("index.docker.io/org/app:1") == DOCKER_HUB
+    assert image_registry("registry-1.docker.io/org/app") == DOCKER_HUB
+
+
+def test_file_images():
+    assert file_images(DOCKERFILE) == [
+        "ghcr.io/org/builder:1.2",
+        "registry.example.org:5000/tools/lint",
+    ]
+    assert file_images(COMPOSE) == ["registry.example.org/web:latest", "redis"]
+    assert registries(file_images(COMPOSE) * 2) == [
+        "registry.example.org",
+        DOCKER_HUB,
+    ]
+
+
+def test_warm_fills_cache():
+    memory = MemoryBackend("test/service")
+    DCC("test/service", backend=memory).put("ghcr.io", "user", "secret")
+    dcc = DCC("test/service", backend=memory)
+    dcc.cache = MemoryCache()
+    dcc.misses = MemoryCache()
+    memory.calls.clear()
+    assert dcc.warm(["ghcr.io", DOCKER_HUB]) == [DOCKER_HUB]
+    assert memory.calls == {"export": 1}
+    assert dcc.get("ghcr.io") == {"Username": "user", "Secret": "secret"}
+    assert dcc.get(DOCKER_HUB) == {}
+    assert memory.calls == {"export": 1}